@@ -0,0 +1,42 @@
+# app/amounts.py
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Optional
+
+# currency markers and thousands separators users type into amount fields
+_NOISE = re.compile(r"(?i)(₹|rs\.?|inr|,|\s)")
+_CENTS = Decimal("0.01")
+# amount columns are Numeric(14, 2)
+MAX_INTEGER_DIGITS = 12
+_LIMIT = Decimal(10) ** MAX_INTEGER_DIGITS
+
+
+def parse_amount(value) -> Optional[Decimal]:
+    """
+    Parses a user-entered amount ("1,250.50", "₹ 300", "Rs. 99") into a
+    2-place Decimal. Returns None for blank or unparseable values and for
+    amounts with more than MAX_INTEGER_DIGITS integer digits, which the
+    amount columns can't store (callers report None as invalid input).
+    """
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        number = value
+    else:
+        text = _NOISE.sub("", str(value))
+        if not text:
+            return None
+        try:
+            number = Decimal(text)
+        except InvalidOperation:
+            return None
+    if not number.is_finite():
+        return None
+    try:
+        number = number.quantize(_CENTS, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        # too many digits for the context precision (e.g. "1e30")
+        return None
+    if abs(number) >= _LIMIT:
+        return None
+    return number
@@ -1,11 +1,35 @@
 # app/auth.py
+import asyncio
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import jwt
+from jose import JWTError, jwt
+from app.cache import revoked_tokens
 from app.config import settings
 
 # Use Argon2 instead of bcrypt
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
+
+# Argon2 is CPU/memory heavy on purpose: run it on its own small pool so a
+# burst of logins can't take over the threads serving the rest of the API
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="argon2",
+)
+_hash_lock = threading.Lock()
+_hash_pending = 0
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash/verify jobs are already waiting."""
 
 
 def hash_password(password: str) -> str:
@@ -16,12 +40,45 @@ def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
 
+async def _run_hash_job(fn, *args):
+    global _hash_pending
+    with _hash_lock:
+        if _hash_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            raise PasswordHasherBusy()
+        _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, fn, *args)
+    finally:
+        with _hash_lock:
+            _hash_pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hash_job(hash_password, password)
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await _run_hash_job(verify_password, plain, hashed)
+
+
+def password_hash_stats() -> dict:
+    pending = _hash_pending
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "pending": pending,
+        "queue_depth": max(0, pending - settings.PASSWORD_HASH_WORKERS),
+        "max_pending": settings.PASSWORD_HASH_MAX_PENDING,
+    }
+
+
 def create_access_token(data: dict, expires_minutes: int = None):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(
+    now = datetime.utcnow()
+    expire = now + timedelta(
         minutes=(expires_minutes or settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex, "type": "access"})
     token = jwt.encode(
         to_encode,
         settings.JWT_SECRET,
@@ -30,9 +87,44 @@ def create_access_token(data: dict, expires_minutes: int = None):
     return token
 
 
+def create_refresh_token(subject: str, role: str, family: str = None):
+    """
+    Returns (token, jti, family, expires_at). Every refresh token of one
+    login (device session) shares a family, so reuse of a rotated token can
+    revoke the whole chain.
+    """
+    jti = uuid.uuid4().hex
+    family = family or uuid.uuid4().hex
+    expires_at = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    token = jwt.encode(
+        {"sub": subject, "role": role, "jti": jti, "fam": family, "exp": expires_at, "type": "refresh"},
+        settings.JWT_SECRET,
+        algorithm=settings.JWT_ALGORITHM
+    )
+    return token, jti, family, expires_at
+
+
 def decode_token(token: str):
     return jwt.decode(
         token,
         settings.JWT_SECRET,
         algorithms=[settings.JWT_ALGORITHM]
     )
+
+
+def decode_access_token(token: str):
+    """decode_token for API access: refuses refresh tokens and revoked tokens (JWTError)."""
+    payload = decode_token(token)
+    # tokens issued before refresh support carry no type; treat them as access tokens
+    if payload.get("type", "access") != "access":
+        raise JWTError("not an access token")
+    if revoked_tokens.is_revoked(payload.get("jti"), payload.get("sub"), payload.get("iat")):
+        raise JWTError("token revoked")
+    return payload
+
+
+def decode_refresh_token(token: str):
+    payload = decode_token(token)
+    if payload.get("type") != "refresh" or not payload.get("jti") or not payload.get("fam"):
+        raise JWTError("not a refresh token")
+    return payload
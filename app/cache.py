@@ -0,0 +1,125 @@
+# app/cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.config import settings
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with a per-entry TTL.
+    Entries can carry a tag so every entry for e.g. one principal can be
+    dropped at once.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._tags: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at, tag = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, tag: Hashable = None) -> None:
+        ttl = self.ttl_seconds if ttl is None else min(ttl, self.ttl_seconds)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.monotonic() + ttl, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.max_entries:
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, tag = self._data.pop(key)
+        if tag is not None:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RevocationSet:
+    """
+    Revoked access tokens, by jti or by subject ("everything issued up to
+    now"), kept only until the tokens involved would have expired anyway,
+    so it stays as small as the number of recent revocations.
+    Per process: other workers stop honouring a revoked token when it
+    expires (ACCESS_TOKEN_EXPIRE_MINUTES) or its refresh is refused.
+    """
+
+    def __init__(self):
+        self._jtis: dict = {}      # jti -> exp (epoch seconds)
+        self._subjects: dict = {}  # subject -> (issued-at cutoff, evict at)
+        self._lock = threading.Lock()
+
+    def revoke_jti(self, jti: str, exp: float) -> None:
+        with self._lock:
+            self._evict()
+            self._jtis[jti] = exp
+
+    def revoke_subject(self, subject: str, max_token_lifetime: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._evict()
+            self._subjects[subject] = (now, now + max_token_lifetime)
+
+    def is_revoked(self, jti: Optional[str], subject: Optional[str], issued_at: Optional[float]) -> bool:
+        if jti is not None and jti in self._jtis:
+            return True
+        entry = self._subjects.get(subject) if subject is not None else None
+        return entry is not None and (issued_at or 0) <= entry[0]
+
+    def _evict(self) -> None:
+        now = time.time()
+        for jti in [j for j, exp in self._jtis.items() if exp <= now]:
+            del self._jtis[jti]
+        for subject in [s for s, (_, until) in self._subjects.items() if until <= now]:
+            del self._subjects[subject]
+
+    def __len__(self) -> int:
+        return len(self._jtis) + len(self._subjects)
+
+
+revoked_tokens = RevocationSet()
+
+# decoded token -> authenticated user/admin snapshot (see deps.get_current_user)
+principal_cache = TTLCache(
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
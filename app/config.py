@@ -1,16 +1,99 @@
 # app/config.py
-from pydantic import BaseSettings
+from typing import Optional
+
+from pydantic import BaseSettings, validator
+
+from app.duplicates import POLICIES as DUPLICATE_POLICIES
 
 class Settings(BaseSettings):
-    DB_HOST: str
-    DB_PORT: int
-    DB_NAME: str
-    DB_USER: str
-    DB_PASS: str
+    # only needed once the engine is first used (see app/database.py), so the
+    # app can be imported without database credentials
+    DB_HOST: Optional[str] = None
+    DB_PORT: int = 3306
+    DB_NAME: Optional[str] = None
+    DB_USER: Optional[str] = None
+    DB_PASS: str = ""
+    # full SQLAlchemy URL overriding the DB_* parts, e.g. a SQLite file for
+    # benchmarks (sqlite:///bench.db)
+    DATABASE_URL: Optional[str] = None
+
+    # connection pool (per worker process)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE: int = 1800  # seconds; keep below MySQL wait_timeout
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_PRE_PING: bool = True
+
+    # optional asyncio engine for async endpoints (needs the driver installed,
+    # e.g. `pip install asyncmy`)
+    DB_ASYNC_ENABLED: bool = False
+    DB_ASYNC_DRIVER: str = "asyncmy"
+
+    # run `python -m app.migrate` from the app's startup (single-process dev
+    # setups); deployments run the command once before starting workers
+    AUTO_MIGRATE: bool = False
 
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    # short-lived access tokens; clients renew them via POST /auth/refresh
+    # (rotating refresh tokens) instead of logging in again
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+
+    # argon2 cost parameters (passlib defaults) and the dedicated hashing pool
+    ARGON2_TIME_COST: int = 2
+    ARGON2_MEMORY_COST: int = 102400  # KiB
+    ARGON2_PARALLELISM: int = 8
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # attachment uploads
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    # keep the unauthenticated /uploads mount for older clients; attachments
+    # are also served (with auth, Range and caching) via /expenses/.../files/{field}
+    SERVE_UPLOADS_STATIC: bool = True
+
+    # WebP previews generated in the background after uploads
+    THUMBNAILS_ENABLED: bool = True
+    THUMBNAIL_MAX_SIZE: int = 320
+    THUMBNAIL_QUALITY: int = 70
+
+    # same vendor + invoice number + amount + date seen before (in any company):
+    # "flag" stores duplicate_of, "reject" refuses the row (409 / import error),
+    # "off" skips the check
+    DUPLICATE_INVOICE_POLICY: str = "flag"
+
+    # in-memory vendor directory; reloaded this often so vendors added on
+    # other workers show up
+    VENDOR_INDEX_REFRESH_SECONDS: int = 60
+
+    # expense change feed: "local" (single process) or "redis" (needs the
+    # redis package; fans events out across workers)
+    EVENT_BUS_BACKEND: str = "local"
+    EVENT_BUS_REDIS_URL: str = "redis://localhost:6379/0"
+    EVENT_BUS_CHANNEL: str = "expense-events"
+    EVENT_STREAM_HEARTBEAT_SECONDS: int = 15
+
+    # Idempotency-Key on POST /expenses/create: completed responses are
+    # replayed for this long; a claim still pending after the timeout is
+    # treated as abandoned
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 24 * 3600
+    IDEMPOTENCY_PENDING_TIMEOUT_SECONDS: int = 300
+
+    # request timing: Prometheus text on /metrics and a Server-Timing header
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING_ENABLED: bool = True
+
+    # in-process cache of authenticated principals (keyed by token)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 300
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 2048
+
+    @validator("DUPLICATE_INVOICE_POLICY")
+    def duplicate_policy_is_known(cls, v):
+        if v not in DUPLICATE_POLICIES:
+            raise ValueError(f"must be one of {', '.join(DUPLICATE_POLICIES)}")
+        return v
 
     class Config:
         env_file = ".env"
@@ -1,7 +1,20 @@
 # app/crud.py
+import base64
+import json
+import logging
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import and_, bindparam, func, insert, literal, or_, select, union_all, update
 from sqlalchemy.orm import Session
-from app import models
-from typing import Optional, List
+from app import duplicates, models, reports, storage
+from app.amounts import parse_amount
+from app.cache import principal_cache, revoked_tokens
+from app.config import settings
+from app.events import event_bus
+from app.vendor_index import vendor_index
+from typing import Optional, List, Tuple
+
+logger = logging.getLogger(__name__)
 
 # -----------------------------
 # User & Admin CRUD (existing)
@@ -25,16 +38,65 @@ def approve_user(db: Session, user_id: int) -> bool:
         return False
     user.approved = True
     db.commit()
+    principal_cache.invalidate_tag(user.email)
     return True
 
 def delete_user(db: Session, user_id: int) -> bool:
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         return False
+    email = user.email
     db.delete(user)
     db.commit()
+    principal_cache.invalidate_tag(email)
+    # their refresh tokens stop working everywhere; access tokens already
+    # issued are refused by this process until they would have expired
+    revoke_refresh_tokens_for(db, email)
+    revoked_tokens.revoke_subject(email, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
     return True
 
+# Refresh tokens
+def create_refresh_token_record(db: Session, jti: str, family: str, subject: str, expires_at: datetime) -> None:
+    # drop this subject's expired tokens while we're here (indexed by subject)
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.subject == subject,
+        models.RefreshToken.expires_at < datetime.utcnow(),
+    ).delete(synchronize_session=False)
+    db.add(models.RefreshToken(jti=jti, family=family, subject=subject, expires_at=expires_at))
+    db.commit()
+
+def rotate_refresh_token(db: Session, jti: str) -> bool:
+    """
+    Marks the refresh token used. Exactly one concurrent caller wins; presenting
+    an already rotated (or revoked) token revokes its whole family, since it
+    means the token was copied.
+    """
+    now = datetime.utcnow()
+    RefreshToken = models.RefreshToken
+    won = db.query(RefreshToken).filter(
+        RefreshToken.jti == jti,
+        RefreshToken.rotated_at.is_(None),
+        RefreshToken.revoked.is_(False),
+        RefreshToken.expires_at > now,
+    ).update({"rotated_at": now}, synchronize_session=False)
+    if not won:
+        family = db.query(RefreshToken.family).filter(RefreshToken.jti == jti).scalar()
+        if family is not None:
+            db.query(RefreshToken).filter(RefreshToken.family == family).update(
+                {"revoked": True}, synchronize_session=False)
+    db.commit()
+    return bool(won)
+
+def revoke_refresh_family(db: Session, family: str) -> None:
+    db.query(models.RefreshToken).filter(models.RefreshToken.family == family).update(
+        {"revoked": True}, synchronize_session=False)
+    db.commit()
+
+def revoke_refresh_tokens_for(db: Session, subject: str) -> None:
+    db.query(models.RefreshToken).filter(models.RefreshToken.subject == subject).update(
+        {"revoked": True}, synchronize_session=False)
+    db.commit()
+
 # Admin helpers
 def get_admin_by_email(db: Session, email: str) -> Optional[models.Admin]:
     return db.query(models.Admin).filter(models.Admin.email == email).first()
@@ -61,6 +123,7 @@ def create_vendor(db: Session, name: str) -> models.Vendor:
     db.add(v)
     db.commit()
     db.refresh(v)
+    vendor_index.add(v)
     return v
 
 # helper: map company string to model class
@@ -73,26 +136,382 @@ _company_model_map = {
 def get_model_for_company(company_name: str):
     return _company_model_map.get(company_name)
 
+def _publish(event_type: str, company_name: str, **data) -> None:
+    # change feed for /expenses/events; called after commit, never fails the write
+    try:
+        event_bus.publish({"type": event_type, "company_name": company_name, **data})
+    except Exception:
+        logger.exception("Failed to publish %s event", event_type)
+
+# numeric shadow columns of the free-text amount fields
+_AMOUNT_COLUMNS = {
+    "invoice_amount": "invoice_amount_value",
+    "amount_paid": "amount_paid_value",
+}
+
+def _sync_amount_columns(values: dict) -> dict:
+    for text_field, value_field in _AMOUNT_COLUMNS.items():
+        if text_field in values:
+            values[value_field] = parse_amount(values[text_field])
+    return values
+
+def _screen_duplicates(db: Session, items: List[tuple], allow_duplicate: bool = False):
+    """
+    Fingerprints each (index, payload) and looks them all up across every
+    company table in one probe. Per DUPLICATE_INVOICE_POLICY a match either
+    sets payload["duplicate_of"] or rejects the row. Repeats of a fingerprint
+    already in this batch are deferred, to be screened once the first copy
+    is inserted. Returns (ready, deferred, rejected [(index, refs)]).
+    """
+    policy = settings.DUPLICATE_INVOICE_POLICY
+    for _, payload in items:
+        payload["fingerprint"] = duplicates.fingerprint_values(payload)
+        payload.setdefault("duplicate_of", None)  # uniform keys for the multi-row INSERT
+    if policy == "off":
+        return items, [], []
+
+    matches = duplicates.find_matches(db, _company_model_map, (p["fingerprint"] for _, p in items))
+    ready, deferred, rejected, seen = [], [], [], set()
+    for index, payload in items:
+        fp = payload["fingerprint"]
+        if fp in seen:
+            deferred.append((index, payload))
+            continue
+        if fp:
+            seen.add(fp)
+        refs = matches.get(fp, [])
+        if refs:
+            if policy == "reject" and not allow_duplicate:
+                rejected.append((index, refs))
+                continue
+            payload["duplicate_of"] = refs[0]
+        ready.append((index, payload))
+    return ready, deferred, rejected
+
 # Expense CRUD across the three tables
-def create_expense(db: Session, company_name: str, payload: dict):
+def create_expense(db: Session, company_name: str, payload: dict, allow_duplicate: bool = False):
+    """Raises duplicates.DuplicateExpense when the policy is "reject" and the invoice exists."""
     Model = get_model_for_company(company_name)
     if not Model:
         raise ValueError("Unknown company")
 
     # ensure status is set: use provided payload status if present, else default to "Pending"
     payload.setdefault("status", "Pending")
+    _sync_amount_columns(payload)
+    _, _, rejected = _screen_duplicates(db, [(0, payload)], allow_duplicate)
+    if rejected:
+        db.rollback()
+        raise duplicates.DuplicateExpense(rejected[0][1])
 
     inst = Model(**payload)
     db.add(inst)
+    rollup = reports.RollupDelta()
+    rollup.add(company_name, inst)
+    rollup.apply(db)
     db.commit()
     db.refresh(inst)
+    _publish("expense.created", company_name, id=inst.id, status=inst.status, version=inst.version)
     return inst
 
-def list_expenses_for_company(db: Session, company_name: str, limit: int = 100, skip: int = 0):
+def bulk_create_expenses(db: Session, company_name: str, payloads: List[dict], batch_size: int = 500) -> List[tuple]:
+    """
+    Inserts payloads batch_size rows at a time: one duplicate probe, one
+    multi-row INSERT and one commit per batch, with the batch's rollup deltas
+    folded into a single upsert per group. A batch the database rejects is
+    retried row by row to pinpoint the bad rows.
+    Returns [(payload index, error message)].
+    """
+    Model = get_model_for_company(company_name)
+    if not Model:
+        raise ValueError("Unknown company")
+
+    failures = []
+    inserted = 0
+    queue = list(enumerate(payloads))
+    while queue:
+        items, queue = queue[:batch_size], queue[batch_size:]
+        for _, payload in items:
+            payload.setdefault("status", "Pending")
+            _sync_amount_columns(payload)
+        ready, deferred, rejected = _screen_duplicates(db, items)
+        failures.extend((index, f"duplicate invoice of {', '.join(refs)}") for index, refs in rejected)
+        # repeats within this batch go next, so they are checked against the copy inserted now
+        queue = deferred + queue
+        if not ready:
+            continue
+        batch = [payload for _, payload in ready]
+        try:
+            _insert_batch(db, company_name, Model, batch)
+            inserted += len(batch)
+        except Exception:
+            db.rollback()
+            for index, payload in ready:
+                try:
+                    _insert_batch(db, company_name, Model, [payload])
+                    inserted += 1
+                except Exception as e:
+                    db.rollback()
+                    failures.append((index, str(getattr(e, "orig", e))))
+    if inserted:
+        _publish("expense.imported", company_name, count=inserted)
+    return sorted(failures)
+
+def _insert_batch(db: Session, company_name: str, Model, batch: List[dict]) -> None:
+    db.execute(insert(Model), batch)
+    rollup = reports.RollupDelta()
+    for payload in batch:
+        rollup.add(company_name, SimpleNamespace(**payload))
+    rollup.apply(db)
+    db.commit()
+
+# listing filters -> SQL predicates (each backed by an index in models.py)
+def _apply_expense_filters(q, Model, filters: Optional[dict]):
+    if not filters:
+        return q
+    if filters.get("status") is not None:
+        q = q.filter(Model.status == filters["status"])
+    if filters.get("date_from") is not None:
+        q = q.filter(Model.date >= filters["date_from"])
+    if filters.get("date_to") is not None:
+        q = q.filter(Model.date <= filters["date_to"])
+    if filters.get("vendor_name") is not None:
+        q = q.filter(Model.vendor_name == filters["vendor_name"])
+    if filters.get("expense_type_flag") is not None:
+        q = q.filter(Model.expense_type_flag == filters["expense_type_flag"])
+    if filters.get("payment_type_flag") is not None:
+        q = q.filter(Model.payment_type_flag == filters["payment_type_flag"])
+    if filters.get("submitted_by") is not None:
+        q = q.filter(Model.submitted_by == filters["submitted_by"])
+    if filters.get("min_amount") is not None:
+        q = q.filter(Model.invoice_amount_value >= filters["min_amount"])
+    if filters.get("max_amount") is not None:
+        q = q.filter(Model.invoice_amount_value <= filters["max_amount"])
+    if filters.get("duplicate") is not None:
+        q = q.filter(Model.duplicate_of.isnot(None) if filters["duplicate"] else Model.duplicate_of.is_(None))
+    return q
+
+# sortable columns for the offset listing; "-field" sorts descending
+EXPENSE_SORT_FIELDS = ("created_at", "date", "vendor_name", "status", "invoice_number")
+
+def _expense_order_by(Model, sort: Optional[str]):
+    sort = sort or "-created_at"
+    field = sort.lstrip("-")
+    if field not in EXPENSE_SORT_FIELDS:
+        raise ValueError(f"Cannot sort by {field}")
+    column = getattr(Model, field)
+    if sort.startswith("-"):
+        return column.desc(), Model.id.desc()
+    return column.asc(), Model.id.asc()
+
+def list_expenses_for_company(
+    db: Session,
+    company_name: str,
+    limit: int = 100,
+    skip: int = 0,
+    filters: Optional[dict] = None,
+    sort: Optional[str] = None,
+):
+    Model = get_model_for_company(company_name)
+    if not Model:
+        return []
+    return db.execute(expense_list_stmt(Model, limit, skip, filters, sort)).scalars().all()
+
+def list_expense_versions(
+    db: Session,
+    company_name: str,
+    limit: int = 100,
+    skip: int = 0,
+    filters: Optional[dict] = None,
+    sort: Optional[str] = None,
+):
+    """(id, version) pairs of a listing page, for cheap ETag revalidation."""
     Model = get_model_for_company(company_name)
     if not Model:
         return []
-    return db.query(Model).order_by(Model.created_at.desc()).offset(skip).limit(limit).all()
+    return db.execute(expense_list_stmt(Model, limit, skip, filters, sort, columns=(Model.id, Model.version))).all()
+
+# statement builders shared with crud_async
+def expense_list_stmt(Model, limit: int, skip: int, filters: Optional[dict], sort: Optional[str], columns=None):
+    stmt = _apply_expense_filters(select(*columns) if columns else select(Model), Model, filters)
+    return stmt.order_by(*_expense_order_by(Model, sort)).offset(skip).limit(limit)
+
+def expense_version_stmt(Model, expense_id: int):
+    return select(Model.version, Model.updated_at, Model.created_at).where(Model.id == expense_id)
+
+# keyset (cursor) pagination helpers
+def encode_cursor(created_at: datetime, expense_id: int, source: Optional[str] = None) -> str:
+    data = {"c": created_at.isoformat(), "i": expense_id}
+    if source is not None:
+        data["s"] = source
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor_data(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        data["c"] = datetime.fromisoformat(data["c"])
+        data["i"] = int(data["i"])
+        return data
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    data = _decode_cursor_data(cursor)
+    return data["c"], data["i"]
+
+def decode_group_cursor(cursor: str) -> Tuple[datetime, str, int]:
+    """Cursor of the cross-company listing: (created_at, source table, id)."""
+    data = _decode_cursor_data(cursor)
+    if not isinstance(data.get("s"), str):
+        raise ValueError("Invalid cursor")
+    return data["c"], data["s"], data["i"]
+
+def list_expenses_page(
+    db: Session,
+    company_name: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    filters: Optional[dict] = None,
+):
+    """
+    Returns (items, next_cursor). Walks the (created_at, id) index instead of
+    OFFSET, so every page costs the same regardless of depth.
+    """
+    Model = get_model_for_company(company_name)
+    if not Model:
+        return [], None
+    rows = db.execute(expense_page_stmt(Model, limit, cursor, filters)).scalars().all()
+    return split_page(rows, limit)
+
+def expense_page_stmt(Model, limit: int, cursor: Optional[str], filters: Optional[dict]):
+    stmt = _apply_expense_filters(select(Model), Model, filters)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            Model.created_at < created_at,
+            and_(Model.created_at == created_at, Model.id < last_id),
+        ))
+    # fetch one extra row to know whether another page exists
+    return stmt.order_by(Model.created_at.desc(), Model.id.desc()).limit(limit + 1)
+
+def split_page(rows, limit: int):
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+def list_expenses_all_companies(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    filters: Optional[dict] = None,
+    company_names: Optional[List[str]] = None,
+):
+    """
+    One keyset page across every company table, merged in the database:
+    each table contributes at most limit+1 rows from its (created_at, id)
+    index and a UNION ALL orders them by (created_at, source, id) DESC.
+    Returns (rows as dicts, next_cursor).
+    """
+    after = decode_group_cursor(cursor) if cursor else None
+    names = list(models.ExpenseThinksonic.__table__.columns.keys())
+
+    branches = []
+    for company_name, Model in _company_model_map.items():
+        if company_names and company_name not in company_names:
+            continue
+        source = Model.__tablename__
+        branch = select(*(getattr(Model, n) for n in names), literal(source).label("source"))
+        branch = _apply_expense_filters(branch, Model, filters)
+        if after:
+            created_at, after_source, after_id = after
+            if source == after_source:
+                branch = branch.where(or_(
+                    Model.created_at < created_at,
+                    and_(Model.created_at == created_at, Model.id < after_id),
+                ))
+            elif source < after_source:
+                branch = branch.where(Model.created_at <= created_at)
+            else:
+                branch = branch.where(Model.created_at < created_at)
+        branch = branch.order_by(Model.created_at.desc(), Model.id.desc()).limit(limit + 1)
+        # wrap so every UNION member may carry its own ORDER BY/LIMIT
+        branches.append(select(branch.subquery()))
+
+    if not branches:
+        return [], None
+
+    merged = union_all(*branches).subquery()
+    rows = db.execute(
+        select(merged)
+        .order_by(merged.c.created_at.desc(), merged.c.source.desc(), merged.c.id.desc())
+        .limit(limit + 1)
+    ).mappings().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"], last["source"])
+    return [dict(row) for row in rows], next_cursor
+
+# columns written by the CSV/XLSX export, in order
+EXPORT_COLUMNS = (
+    "id", "company_name", "gst_number", "expense_type", "date", "invoice_number",
+    "vendor_name", "invoice_amount", "purpose", "purchased_by", "amount_paid_by",
+    "payment_type", "amount_paid", "status", "submitted_by", "created_at",
+    "invoice_copy", "qrcode", "payment_screenshot",
+)
+
+def iter_expense_rows(db: Session, company_names: List[str], filters: Optional[dict] = None, batch_size: int = 1000):
+    """
+    Yields plain row tuples (EXPORT_COLUMNS order) for each company in turn,
+    streamed from a server-side cursor so memory stays flat.
+    """
+    for company_name in company_names:
+        Model = get_model_for_company(company_name)
+        if not Model:
+            continue
+        stmt = _apply_expense_filters(
+            select(*(getattr(Model, c) for c in EXPORT_COLUMNS)), Model, filters
+        ).order_by(Model.created_at, Model.id)
+        result = db.execute(stmt.execution_options(yield_per=batch_size))
+        for row in result:
+            yield tuple(row)
+
+def batch_update_status(
+    db: Session,
+    company_names: List[str],
+    status: str,
+    submitted_by: Optional[str] = None,
+    ids: Optional[List[int]] = None,
+    filters: Optional[dict] = None,
+) -> dict:
+    """
+    Sets status on every matching row with one set-based UPDATE per company
+    table (no ORM load/refresh) and a single commit. Returns {company: rows}.
+    """
+    values = {"status": status, "updated_at": func.now()}
+    if submitted_by:
+        values["submitted_by"] = submitted_by
+
+    counts = {}
+    for company_name in company_names:
+        Model = get_model_for_company(company_name)
+        if not Model:
+            continue
+        stmt = update(Model).values(version=Model.version + 1, **values)
+        if ids:
+            stmt = stmt.where(Model.id.in_(ids))
+        stmt = _apply_expense_filters(stmt, Model, filters)
+        result = db.execute(stmt.execution_options(synchronize_session=False))
+        counts[company_name] = result.rowcount
+    db.commit()
+    for company_name, count in counts.items():
+        if count:
+            _publish("expense.batch_updated", company_name, ids=ids, status=status, count=count)
+    return counts
 
 def get_expense(db: Session, company_name: str, expense_id: int):
     Model = get_model_for_company(company_name)
@@ -100,6 +519,13 @@ def get_expense(db: Session, company_name: str, expense_id: int):
         return None
     return db.query(Model).filter(Model.id == expense_id).first()
 
+def get_expense_version(db: Session, company_name: str, expense_id: int):
+    """(version, updated_at, created_at) without loading the row, or None."""
+    Model = get_model_for_company(company_name)
+    if not Model:
+        return None
+    return db.execute(expense_version_stmt(Model, expense_id)).first()
+
 def update_expense(db: Session, company_name: str, expense_id: int, changes: dict):
     Model = get_model_for_company(company_name)
     if not Model:
@@ -107,12 +533,40 @@ def update_expense(db: Session, company_name: str, expense_id: int, changes: dic
     inst = db.query(Model).filter(Model.id == expense_id).first()
     if not inst:
         return None
+    # every attachment in changes is a fresh upload that already holds a blob
+    # reference, so the old one is released even when the content is identical
+    orphaned = [
+        storage.release_blob(db, getattr(inst, field))
+        for field in storage.ATTACHMENT_FIELDS
+        if field in changes
+    ]
+    _sync_amount_columns(changes)
+    rollup = reports.RollupDelta()
+    rollup.add(company_name, inst, sign=-1)
     for k, v in changes.items():
         setattr(inst, k, v)
+    if any(field in changes for field in duplicates.FINGERPRINT_FIELDS):
+        _refresh_fingerprint(db, company_name, inst)
+    inst.version = Model.version + 1
+    rollup.add(company_name, inst)
+    rollup.apply(db)
     db.commit()
+    storage.remove_orphans(db, orphaned)
     db.refresh(inst)
+    _publish("expense.updated", company_name, id=inst.id, status=inst.status, version=inst.version)
     return inst
 
+def _refresh_fingerprint(db: Session, company_name: str, inst) -> None:
+    # edits are never rejected, only (un)flagged
+    inst.fingerprint = duplicates.fingerprint(inst.vendor_name, inst.invoice_number, inst.invoice_amount_value, inst.date)
+    if settings.DUPLICATE_INVOICE_POLICY == "off":
+        return
+    own = duplicates.reference(company_name, inst.id)
+    with db.no_autoflush:
+        refs = duplicates.find_matches(db, _company_model_map, [inst.fingerprint]).get(inst.fingerprint, [])
+    refs = [ref for ref in refs if ref != own]
+    inst.duplicate_of = refs[0] if refs else None
+
 def delete_expense(db: Session, company_name: str, expense_id: int) -> bool:
     Model = get_model_for_company(company_name)
     if not Model:
@@ -120,6 +574,125 @@ def delete_expense(db: Session, company_name: str, expense_id: int) -> bool:
     inst = db.query(Model).filter(Model.id == expense_id).first()
     if not inst:
         return False
+    orphaned = [storage.release_blob(db, getattr(inst, field)) for field in storage.ATTACHMENT_FIELDS]
+    rollup = reports.RollupDelta()
+    rollup.add(company_name, inst, sign=-1)
+    rollup.apply(db)
     db.delete(inst)
     db.commit()
+    storage.remove_orphans(db, orphaned)
+    _publish("expense.deleted", company_name, id=expense_id)
     return True
+
+def backfill_amount_columns(db: Session, Model, batch_size: int = 1000, start_after: int = 0, progress=None) -> dict:
+    """
+    Fills invoice_amount_value/amount_paid_value from the text columns in
+    primary-key order, one short transaction per batch, so it never holds
+    long locks. Safe to stop and resume: pass the last reported id as
+    start_after (rows already filled are skipped either way). Safe to run
+    online: a row is only written if its amount text is still what was read,
+    so an update_expense that lands mid-batch is never overwritten.
+    """
+    table = Model.__table__
+    write = (
+        update(table)
+        .where(
+            table.c.id == bindparam("b_id"),
+            table.c.invoice_amount.is_not_distinct_from(bindparam("b_invoice_amount")),
+            table.c.amount_paid.is_not_distinct_from(bindparam("b_amount_paid")),
+        )
+        .values(
+            invoice_amount_value=bindparam("b_invoice_amount_value"),
+            amount_paid_value=bindparam("b_amount_paid_value"),
+        )
+    )
+    last_id, updated, unparseable = start_after, 0, 0
+    pending = or_(
+        and_(Model.invoice_amount_value.is_(None), Model.invoice_amount.isnot(None)),
+        and_(Model.amount_paid_value.is_(None), Model.amount_paid.isnot(None)),
+    )
+    while True:
+        rows = db.execute(
+            select(Model.id, Model.invoice_amount, Model.amount_paid)
+            .where(Model.id > last_id, pending)
+            .order_by(Model.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        batch = []
+        for row in rows:
+            values = _sync_amount_columns({"invoice_amount": row.invoice_amount, "amount_paid": row.amount_paid})
+            for text_field, value_field in _AMOUNT_COLUMNS.items():
+                if values[text_field] and values[text_field].strip() and values[value_field] is None:
+                    unparseable += 1
+            batch.append({
+                "b_id": row.id,
+                "b_invoice_amount": row.invoice_amount,
+                "b_amount_paid": row.amount_paid,
+                "b_invoice_amount_value": values["invoice_amount_value"],
+                "b_amount_paid_value": values["amount_paid_value"],
+            })
+        updated += db.execute(write, batch).rowcount
+        db.commit()
+        last_id = rows[-1].id
+        if progress:
+            progress(Model.__tablename__, last_id, updated)
+    return {"updated": updated, "unparseable": unparseable, "last_id": last_id}
+
+def backfill_fingerprints(db: Session, company_name: str, batch_size: int = 1000, start_after: int = 0, progress=None) -> dict:
+    """
+    Fills the duplicate-detection fingerprint for rows created before it
+    existed, in primary-key order with one probe per batch, and flags rows
+    whose invoice is already on an older row (by created_at, then id), so an
+    original is never marked as a duplicate of a later copy.
+    Resumable like backfill_amount_columns, and likewise safe online: rows
+    fingerprinted in the meantime (by update_expense) are left alone.
+    """
+    Model = get_model_for_company(company_name)
+    table = Model.__table__
+    write = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"), table.c.fingerprint.is_(None))
+        .values(fingerprint=bindparam("b_fingerprint"), duplicate_of=bindparam("b_duplicate_of"))
+    )
+    flag = settings.DUPLICATE_INVOICE_POLICY != "off"
+    last_id, updated, flagged = start_after, 0, 0
+    while True:
+        rows = db.execute(
+            select(Model.id, Model.created_at, Model.vendor_name, Model.invoice_number,
+                   Model.invoice_amount, Model.invoice_amount_value, Model.date)
+            .where(Model.id > last_id, Model.fingerprint.is_(None))
+            .order_by(Model.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        fingerprints = {
+            row.id: duplicates.fingerprint(
+                row.vendor_name, row.invoice_number,
+                row.invoice_amount_value if row.invoice_amount_value is not None else row.invoice_amount,
+                row.date,
+            )
+            for row in rows
+        }
+        matches = duplicates.find_earlier_matches(db, _company_model_map, fingerprints.values()) if flag else {}
+        first_seen, batch = {}, []
+        for row in rows:
+            fp = fingerprints[row.id]
+            own_key = (row.created_at, row.id, company_name)
+            # rows fingerprinted since the feature shipped may be newer than this one
+            refs = [ref for key, ref in matches.get(fp, []) if key < own_key]
+            if not refs and fp in first_seen:
+                refs = [first_seen[fp]]
+            if fp and fp not in first_seen:
+                first_seen[fp] = duplicates.reference(company_name, row.id)
+            duplicate_of = refs[0] if flag and refs else None
+            flagged += duplicate_of is not None
+            batch.append({"b_id": row.id, "b_fingerprint": fp, "b_duplicate_of": duplicate_of})
+        updated += db.execute(write, batch).rowcount
+        db.commit()
+        last_id = rows[-1].id
+        if progress:
+            progress(Model.__tablename__, last_id, updated)
+    return {"updated": updated, "flagged": flagged, "last_id": last_id}
@@ -0,0 +1,66 @@
+# app/crud_async.py
+# asyncio variants of the hot read paths in crud.py (used when
+# settings.DB_ASYNC_ENABLED); statements are shared with the sync versions
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+
+
+async def get_expense(db: AsyncSession, company_name: str, expense_id: int):
+    Model = crud.get_model_for_company(company_name)
+    if not Model:
+        return None
+    result = await db.execute(select(Model).where(Model.id == expense_id))
+    return result.scalars().first()
+
+async def get_expense_version(db: AsyncSession, company_name: str, expense_id: int):
+    Model = crud.get_model_for_company(company_name)
+    if not Model:
+        return None
+    result = await db.execute(crud.expense_version_stmt(Model, expense_id))
+    return result.first()
+
+async def list_expense_versions(
+    db: AsyncSession,
+    company_name: str,
+    limit: int = 100,
+    skip: int = 0,
+    filters: Optional[dict] = None,
+    sort: Optional[str] = None,
+):
+    Model = crud.get_model_for_company(company_name)
+    if not Model:
+        return []
+    stmt = crud.expense_list_stmt(Model, limit, skip, filters, sort, columns=(Model.id, Model.version))
+    result = await db.execute(stmt)
+    return result.all()
+
+async def list_expenses_for_company(
+    db: AsyncSession,
+    company_name: str,
+    limit: int = 100,
+    skip: int = 0,
+    filters: Optional[dict] = None,
+    sort: Optional[str] = None,
+) -> List:
+    Model = crud.get_model_for_company(company_name)
+    if not Model:
+        return []
+    result = await db.execute(crud.expense_list_stmt(Model, limit, skip, filters, sort))
+    return result.scalars().all()
+
+async def list_expenses_page(
+    db: AsyncSession,
+    company_name: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    filters: Optional[dict] = None,
+):
+    Model = crud.get_model_for_company(company_name)
+    if not Model:
+        return [], None
+    result = await db.execute(crud.expense_page_stmt(Model, limit, cursor, filters))
+    return crud.split_page(result.scalars().all(), limit)
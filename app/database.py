@@ -1,20 +1,95 @@
 # app/database.py
+"""
+Engines are created on first use, so importing the app reads no credentials
+and opens no connections. Schema changes are applied by `python -m
+app.migrate`, not at import or startup.
+"""
+import threading
+from typing import Optional
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-import os
-
-DB_HOST = os.environ["DB_HOST"]
-DB_PORT = os.environ["DB_PORT"]
-DB_USER = os.environ["DB_USER"]
-DB_PASS = os.environ["DB_PASS"]
-DB_NAME = os.environ["DB_NAME"]
-
-DATABASE_URL = (
-    f"mysql+pymysql://{DB_USER}:{DB_PASS}"
-    f"@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+from app.config import settings
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+POOL_OPTIONS = dict(
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+)
+
+_lock = threading.Lock()
+_engine: Optional[Engine] = None
+_async_engine = None
+_async_sessionmaker = None
+
+# bound to the engine by get_engine()
+_sessionmaker = sessionmaker(autocommit=False, autoflush=False)
+
+
+def database_url(driver: str = "pymysql") -> str:
+    if settings.DATABASE_URL and driver == "pymysql":
+        return settings.DATABASE_URL
+    missing = [name for name in ("DB_HOST", "DB_NAME", "DB_USER") if not getattr(settings, name)]
+    if missing:
+        raise RuntimeError(f"Database is not configured: set DATABASE_URL or {', '.join(missing)}")
+    return (
+        f"mysql+{driver}://{settings.DB_USER}:{settings.DB_PASS}"
+        f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+    )
+
+
+def get_engine() -> Engine:
+    """The process-wide engine, created on first call (no connection is opened until a query runs)."""
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                url = database_url()
+                # SQLite connections are shared across the threadpool
+                connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+                engine = create_engine(url, connect_args=connect_args, **POOL_OPTIONS)
+                _sessionmaker.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def SessionLocal(**kwargs) -> Session:
+    if _engine is None:
+        get_engine()
+    return _sessionmaker(**kwargs)
+
+
+def get_async_sessionmaker():
+    """
+    async_sessionmaker for the optional asyncio engine (see crud_async /
+    deps.get_async_db), or None when settings.DB_ASYNC_ENABLED is off.
+    """
+    global _async_engine, _async_sessionmaker
+    if not settings.DB_ASYNC_ENABLED:
+        return None
+    if _async_sessionmaker is None:
+        with _lock:
+            if _async_sessionmaker is None:
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+                _async_engine = create_async_engine(database_url(settings.DB_ASYNC_DRIVER), **POOL_OPTIONS)
+                _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+async def dispose_engines() -> None:
+    """Closes pooled connections at shutdown; engines are recreated if used again."""
+    global _engine, _async_engine, _async_sessionmaker
+    with _lock:
+        engine, async_engine = _engine, _async_engine
+        _engine = _async_engine = _async_sessionmaker = None
+    if engine is not None:
+        engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
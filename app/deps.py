@@ -1,14 +1,18 @@
 # app/deps.py
 
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import inspect
 from sqlalchemy.orm import Session
 from jose import JWTError
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
-from app.database import SessionLocal
-from app.auth import decode_token
-from app import models
+from app.database import SessionLocal, get_async_sessionmaker
+from app.auth import decode_access_token
+from app.cache import principal_cache, revoked_tokens
+from app import metrics, models
 
 
 # OAuth2 scheme: token must be sent as Authorization: Bearer <token>
@@ -23,17 +27,56 @@ def get_db() -> Generator:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator:
+    """
+    Yields an AsyncSession when settings.DB_ASYNC_ENABLED is on, else None
+    (endpoints then fall back to the sync session on the threadpool).
+    """
+    AsyncSessionLocal = get_async_sessionmaker()
+    if AsyncSessionLocal is None:
+        yield None
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _snapshot(principal):
+    # plain column values, so the cached copy never touches a (closed) session
+    values = {attr.key: getattr(principal, attr.key) for attr in inspect(type(principal)).column_attrs}
+    return type(principal), values
+
+
+def _from_snapshot(snapshot):
+    Model, values = snapshot
+    return Model(**values)
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ):
     """
     Validates JWT token, returns the authenticated user or admin.
+    Principals are cached per token, so repeat calls skip decoding and the DB.
     """
+    with metrics.timed("auth"):
+        return _resolve_principal(token, db)
 
-    # 1. Decode token
+
+def _resolve_principal(token: str, db: Session):
+    # 1. Principal cache: an entry only exists for an access token that
+    #    already verified, and it expires no later than the token itself;
+    #    revocations are checked against the claims kept alongside
+    cached = principal_cache.get(token)
+    if cached is not None:
+        snapshot, claims = cached
+        if not revoked_tokens.is_revoked(*claims):
+            return _from_snapshot(snapshot)
+        principal_cache.delete(token)
+
+    # 2. Decode token (refresh tokens and revoked tokens are rejected here)
     try:
-        payload = decode_token(token)
+        payload = decode_access_token(token)
         email: str = payload.get("sub")   # username/email encoded inside token
 
         if email is None:
@@ -48,15 +91,20 @@ def get_current_user(
             detail="Token verification failed",
         )
 
-    # 2. Check if this user exists in database (admin or user)
-
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user:
-        return user
+    # 3. Check if this user exists in database (admin or user)
+    principal = db.query(models.User).filter(models.User.email == email).first()
+    if principal is None:
+        principal = db.query(models.Admin).filter(models.Admin.email == email).first()
 
-    admin = db.query(models.Admin).filter(models.Admin.email == email).first()
-    if admin:
-        return admin
+    if principal:
+        snapshot = _snapshot(principal)
+        ttl = payload.get("exp", 0) - time.time()
+        claims = (payload.get("jti"), email, payload.get("iat"))
+        principal_cache.set(token, (snapshot, claims), ttl=ttl, tag=email)
+        # end the read transaction so the pooled connection isn't held
+        # while the endpoint parses uploads or writes files
+        db.rollback()
+        return _from_snapshot(snapshot)
 
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
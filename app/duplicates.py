@@ -0,0 +1,100 @@
+# app/duplicates.py
+"""
+Duplicate invoice detection at ingest.
+
+Every expense stores a fingerprint of its normalized vendor, invoice number,
+invoice amount and date (indexed on each company table). Ingest looks the new
+fingerprints up across all tables in one UNION ALL of index probes, then
+either flags the row (duplicate_of = "<company>:<id>") or rejects it,
+depending on settings.DUPLICATE_INVOICE_POLICY.
+"""
+import hashlib
+import re
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.orm import Session
+
+from app.amounts import parse_amount
+
+POLICIES = ("flag", "reject", "off")
+
+# columns that feed the fingerprint; updates touching these recompute it
+FINGERPRINT_FIELDS = ("vendor_name", "invoice_number", "invoice_amount", "date")
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+class DuplicateExpense(ValueError):
+    """Raised in "reject" mode; matches are "<company>:<id>" references."""
+
+    def __init__(self, matches: List[str]):
+        super().__init__(f"duplicate of {', '.join(matches)}")
+        self.matches = matches
+
+
+def _normalize(value) -> str:
+    return _NON_ALNUM.sub("", str(value or "").lower())
+
+
+def fingerprint(vendor_name, invoice_number, invoice_amount, expense_date) -> Optional[str]:
+    """
+    SHA-256 over the normalized fields, or None when vendor or invoice number
+    is missing (such rows are never treated as duplicates).
+    """
+    vendor, number = _normalize(vendor_name), _normalize(invoice_number)
+    if not vendor or not number:
+        return None
+    amount = parse_amount(invoice_amount) if isinstance(invoice_amount, str) else invoice_amount
+    if isinstance(expense_date, datetime):
+        expense_date = expense_date.date()
+    day = expense_date.isoformat() if isinstance(expense_date, date) else str(expense_date or "")
+    raw = "|".join((vendor, number, str(amount) if amount is not None else "", day))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def fingerprint_values(values) -> Optional[str]:
+    """Fingerprint of an expense payload dict."""
+    return fingerprint(
+        values.get("vendor_name"),
+        values.get("invoice_number"),
+        values.get("invoice_amount_value", values.get("invoice_amount")),
+        values.get("date"),
+    )
+
+
+def reference(company_name: str, expense_id: int) -> str:
+    return f"{company_name}:{expense_id}"
+
+
+def _match_rows(db: Session, company_models: dict, fingerprints: Iterable[str]) -> list:
+    # (company, id, fingerprint, created_at) of existing rows, oldest first, in one statement
+    wanted = sorted({fp for fp in fingerprints if fp})
+    if not wanted:
+        return []
+    branches = [
+        select(literal(company_name).label("company"), Model.id, Model.fingerprint, Model.created_at)
+        .where(Model.fingerprint.in_(wanted))
+        for company_name, Model in company_models.items()
+    ]
+    return sorted(db.execute(union_all(*branches)).all(), key=lambda r: (r.created_at, r.id, r.company))
+
+
+def find_matches(db: Session, company_models: dict, fingerprints: Iterable[str]) -> Dict[str, List[str]]:
+    """{fingerprint: ["<company>:<id>", ...]} for existing rows (oldest first), in one statement."""
+    matches: Dict[str, List[str]] = {}
+    for company, expense_id, fp, _ in _match_rows(db, company_models, fingerprints):
+        matches.setdefault(fp, []).append(reference(company, expense_id))
+    return matches
+
+
+def find_earlier_matches(db: Session, company_models: dict, fingerprints: Iterable[str]) -> Dict[str, List[tuple]]:
+    """
+    Like find_matches, but each match comes with its (created_at, id, company)
+    sort key, so callers can keep only rows older than the one being checked.
+    """
+    matches: Dict[str, List[tuple]] = {}
+    for company, expense_id, fp, created_at in _match_rows(db, company_models, fingerprints):
+        matches.setdefault(fp, []).append(((created_at, expense_id, company), reference(company, expense_id)))
+    return matches
@@ -0,0 +1,144 @@
+# app/events.py
+import asyncio
+import json
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LocalEventBus:
+    """
+    In-process pub/sub for expense change events. publish() may be called
+    from any thread (sync CRUD runs on the threadpool); each subscriber gets
+    its own bounded queue on its own event loop, and a subscriber that falls
+    behind loses its oldest events rather than blocking publishers.
+    """
+
+    def __init__(self, max_queue: int = 256):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def publish(self, event: dict) -> None:
+        self._fan_out(event)
+
+    def _fan_out(self, event: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # subscriber's loop is gone
+                with self._lock:
+                    self._subscribers.discard((loop, queue))
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: dict) -> None:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue]:
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.max_queue))
+        with self._lock:
+            self._subscribers.add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                self._subscribers.discard(entry)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+class RedisEventBus(LocalEventBus):
+    """
+    Multi-worker backend: events are published to a Redis channel and every
+    worker relays what it receives to its local subscribers. The listener
+    reconnects with capped backoff when Redis drops the connection; events
+    published while it is disconnected are not delivered on this worker.
+    """
+
+    RECONNECT_MIN_SECONDS = 0.5
+    RECONNECT_MAX_SECONDS = 30.0
+
+    def __init__(self, url: str, channel: str, max_queue: int = 256):
+        super().__init__(max_queue=max_queue)
+        import redis  # optional dependency, only needed for this backend
+
+        self.url = url
+        self.channel = channel
+        self._publisher = redis.Redis.from_url(url)
+        self._listener = None
+        self._subscribed = False
+
+    async def start(self) -> None:
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+    def publish(self, event: dict) -> None:
+        self._publisher.publish(self.channel, json.dumps(event, default=str))
+
+    async def _listen(self) -> None:
+        # runs until stop() cancels it; any other error means reconnect
+        delay = self.RECONNECT_MIN_SECONDS
+        while True:
+            self._subscribed = False
+            try:
+                await self._listen_once()
+                logger.warning("Redis event stream on %s ended", self.channel)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Redis event listener on %s failed", self.channel)
+            if self._subscribed:
+                # the connection worked for a while; start over with a short wait
+                delay = self.RECONNECT_MIN_SECONDS
+            logger.info("Reconnecting to Redis in %.1fs", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+
+    async def _listen_once(self) -> None:
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+            async for message in pubsub.listen():
+                if message.get("type") == "subscribe":
+                    self._subscribed = True
+                    logger.info("Listening for expense events on %s", self.channel)
+                elif message.get("type") == "message":
+                    self._fan_out(json.loads(message["data"]))
+        finally:
+            await pubsub.close()
+            await client.close()
+
+
+def create_event_bus():
+    if settings.EVENT_BUS_BACKEND == "redis":
+        return RedisEventBus(settings.EVENT_BUS_REDIS_URL, settings.EVENT_BUS_CHANNEL)
+    return LocalEventBus()
+
+
+event_bus = create_event_bus()
@@ -0,0 +1,176 @@
+# app/idempotency.py
+"""
+Idempotency-Key support for retried POSTs (expense creation).
+
+IdempotencyMiddleware runs before routing, so a retry whose key already
+completed is answered from the idempotency_key table without reading the
+multipart body, storing attachments or touching the expense tables.
+Keys are scoped to the authenticated principal and expire after
+settings.IDEMPOTENCY_KEY_TTL_SECONDS.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError
+from sqlalchemy.exc import IntegrityError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+
+from app import models
+from app.auth import decode_access_token
+from app.config import settings
+from app.database import SessionLocal
+
+MAX_KEY_LENGTH = 255
+_PURGE_INTERVAL_SECONDS = 600
+_last_purge = 0.0
+
+
+def _principal(authorization: Optional[str]) -> Optional[str]:
+    # only to scope the key; the endpoint still authenticates the request
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return decode_access_token(authorization[7:].strip()).get("sub")
+    except JWTError:
+        return None
+
+
+def _purge_expired(db, now: datetime) -> None:
+    global _last_purge
+    if time.monotonic() - _last_purge < _PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = time.monotonic()
+    db.query(models.IdempotencyKey).filter(models.IdempotencyKey.expires_at <= now).delete(synchronize_session=False)
+    db.commit()
+
+
+def claim(principal: str, key: str, path: str) -> Tuple[str, Optional[tuple]]:
+    """
+    Returns ("claimed", None) when this request should run, ("replay",
+    (status, content_type, body)) for a completed key, or "in_progress" /
+    "mismatch" (same key used for another endpoint).
+    """
+    Key = models.IdempotencyKey
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        _purge_expired(db, now)
+        record = db.get(Key, (principal, key))
+        if record is not None:
+            stale = record.state == "pending" and record.created_at <= now - timedelta(
+                seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT_SECONDS)
+            if record.expires_at <= now or stale:
+                db.delete(record)
+                db.flush()
+            elif record.path != path:
+                return "mismatch", None
+            elif record.state == "done":
+                return "replay", (record.status_code, record.content_type, record.body)
+            else:
+                return "in_progress", None
+        db.add(Key(
+            principal=principal,
+            key=key,
+            path=path,
+            state="pending",
+            created_at=now,
+            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+        ))
+        db.commit()
+        return "claimed", None
+    except IntegrityError:
+        # a concurrent request claimed it first
+        db.rollback()
+        return "in_progress", None
+    finally:
+        db.close()
+
+
+def complete(principal: str, key: str, status_code: int, content_type: Optional[str], body: bytes) -> None:
+    db = SessionLocal()
+    try:
+        db.query(models.IdempotencyKey).filter_by(principal=principal, key=key).update({
+            "state": "done",
+            "status_code": status_code,
+            "content_type": content_type,
+            "body": body,
+        })
+        db.commit()
+    finally:
+        db.close()
+
+
+def release(principal: str, key: str) -> None:
+    """Forget a key whose request failed, so the client can retry it."""
+    db = SessionLocal()
+    try:
+        db.query(models.IdempotencyKey).filter_by(principal=principal, key=key).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI, so replays never read the request body."""
+
+    def __init__(self, app, paths=("/expenses/create",)):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        principal = _principal(headers.get("authorization")) if key else None
+        if principal is None:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters"}, 400)
+            await response(scope, receive, send)
+            return
+
+        state, stored = await run_in_threadpool(claim, principal, key, scope["path"])
+        if state == "replay":
+            status_code, content_type, body = stored
+            response = Response(body, status_code, media_type=content_type,
+                                headers={"Idempotent-Replayed": "true"})
+            await response(scope, receive, send)
+            return
+        if state == "in_progress":
+            response = JSONResponse({"detail": "A request with this Idempotency-Key is still being processed"},
+                                    409, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        if state == "mismatch":
+            response = JSONResponse({"detail": "Idempotency-Key was already used for a different endpoint"}, 422)
+            await response(scope, receive, send)
+            return
+
+        captured = {"status": 500, "content_type": None, "body": []}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["content_type"] = Headers(raw=message.get("headers", [])).get("content-type")
+            elif message["type"] == "http.response.body":
+                captured["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            await run_in_threadpool(release, principal, key)
+            raise
+        if 200 <= captured["status"] < 300:
+            await run_in_threadpool(
+                complete, principal, key, captured["status"], captured["content_type"], b"".join(captured["body"])
+            )
+        else:
+            # validation/auth/duplicate errors: let the client fix the request and retry with the same key
+            await run_in_threadpool(release, principal, key)
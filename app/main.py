@@ -1,19 +1,41 @@
 # app/main.py
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.database import engine
-from app import models  # now includes expense models & vendor
-from app.routers import auth_router, admin_router, user_router
+from app.database import dispose_engines
+from app.routers import auth_router, admin_router, user_router, report_router, metrics_router
 # <-- changed import for expense router below (import the router object directly)
 from app.routers.expense_router import router as expenses_router
 from app.config import settings
-import os
+from app.events import event_bus
+from app import metrics, storage
+from app.idempotency import IdempotencyMiddleware
+
+
+# Importing this module does no I/O: the engine is created on first use, the
+# schema is managed by `python -m app.migrate`, and the vendor index loads on
+# first lookup. Startup only prepares the upload dirs and the event bus.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    storage.ensure_upload_dirs()
+    if settings.AUTO_MIGRATE:
+        from app.migrate import migrate
+        await run_in_threadpool(migrate)
+    await event_bus.start()
+    try:
+        yield
+    finally:
+        await event_bus.stop()
+        await dispose_engines()
 
-# Create DB tables (dev only)
-models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Expense Backend")
+app = FastAPI(title="Expense Backend", lifespan=lifespan)
+
+# Idempotency-Key replays (added first so CORS and metrics wrap the replayed responses)
+app.add_middleware(IdempotencyMiddleware, paths=("/expenses/create",))
 
 # CORS configuration
 app.add_middleware(
@@ -24,23 +46,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Idempotent-Replayed"],
 )
 
+# Per-route latency, query counts and Server-Timing (see app/metrics.py)
+if settings.METRICS_ENABLED:
+    metrics.install_sqlalchemy_hooks()
+    app.add_middleware(metrics.MetricsMiddleware, server_timing=settings.SERVER_TIMING_ENABLED)
+
 # Register routers
 app.include_router(auth_router.router, prefix="/auth", tags=["Auth"])
 app.include_router(admin_router.router, prefix="/admin", tags=["Admin"])
 app.include_router(user_router.router, prefix="/user", tags=["User"])
 # use the directly imported router
 app.include_router(expenses_router, prefix="/expenses", tags=["Expenses"])
+app.include_router(report_router.router, prefix="/reports", tags=["Reports"])
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router.router, tags=["Metrics"])
 
-# Ensure uploads folder exists and mount
-UPLOADS_DIR = "uploads"
-os.makedirs(os.path.join(UPLOADS_DIR, "invoices"), exist_ok=True)
-os.makedirs(os.path.join(UPLOADS_DIR, "qrcodes"), exist_ok=True)
-os.makedirs(os.path.join(UPLOADS_DIR, "screenshots"), exist_ok=True)
-
-# Expose uploads via /uploads URL (OPTIONAL - useful for previewing files)
-app.mount("/uploads", StaticFiles(directory=UPLOADS_DIR), name="uploads")
+# Expose uploads via /uploads URL (OPTIONAL - useful for previewing files);
+# the folder is created at startup, hence check_dir=False
+if settings.SERVE_UPLOADS_STATIC:
+    app.mount("/uploads", StaticFiles(directory=storage.UPLOAD_DIR, check_dir=False), name="uploads")
 
 @app.get("/")
 def root():
@@ -0,0 +1,326 @@
+# app/metrics.py
+"""
+Request timing and DB query instrumentation.
+
+MetricsMiddleware tracks one RequestStats per request (through a contextvar,
+so threadpool code sees it too). SQLAlchemy engine/session events and
+metrics.timed() blocks add to it. At the end of the request the totals go
+into the Prometheus histograms rendered by /metrics, and a Server-Timing
+header shows the per-request breakdown in the browser's network panel.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (1024, 16 * 1024, 256 * 1024, 1024 * 1024, 8 * 1024 * 1024, 64 * 1024 * 1024)
+
+
+# -----------------------------
+# Minimal Prometheus registry
+# -----------------------------
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for key, data in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, data):
+                cumulative += n
+                le = 'le="%s"' % bound
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {data[-1]}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {data[-2]}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {data[-1]}")
+        return out
+
+
+class Gauge(_Metric):
+    """Read at scrape time from callback()."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self):
+        try:
+            return [f"{self.name} {self.callback()}"]
+        except Exception:
+            return []
+
+
+REGISTRY: list = []
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency.", ("method", "route"))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "SQL statements per request.", ("route",),
+                            buckets=QUERY_COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in SQL per request.", ("route",))
+REQUEST_BODY_BYTES = Histogram("http_request_body_bytes", "Request body size.", ("route",), buckets=BYTES_BUCKETS)
+STAGE_SECONDS = Histogram("http_request_stage_seconds",
+                          "Time per request stage (auth, body, upload, commit).", ("route", "stage"))
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed.")
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement latency.")
+UPLOAD_BYTES = Counter("upload_bytes_total", "Attachment bytes stored.")
+
+
+# -----------------------------
+# Per-request stats
+# -----------------------------
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "body_bytes", "stages")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.body_bytes = 0
+        self.stages: Dict[str, float] = {}
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        parts = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"']
+        parts.extend(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+class timed:
+    """with metrics.timed("upload"): ... adds the block's duration to the current request."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stats = _current.get()
+        if stats is not None:
+            stats.add_stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+# -----------------------------
+# SQLAlchemy hooks
+# -----------------------------
+_hooks_installed = False
+
+
+def install_sqlalchemy_hooks() -> None:
+    """Listens on every Engine (sync, and the sync side of async engines) and Session."""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    _hooks_installed = True
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERIES.inc()
+        DB_QUERY_SECONDS.observe(elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(Engine, "handle_error")
+    def _on_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    @event.listens_for(Session, "before_commit")
+    def _before_commit(session):
+        session.info["commit_start"] = time.perf_counter()
+
+    @event.listens_for(Session, "after_commit")
+    def _after_commit(session):
+        start = session.info.pop("commit_start", None)
+        stats = _current.get()
+        if start is not None and stats is not None:
+            stats.add_stage("commit", time.perf_counter() - start)
+
+
+# -----------------------------
+# ASGI middleware
+# -----------------------------
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    # template path, not the raw URL, so label cardinality stays bounded
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or "other"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI (not BaseHTTPMiddleware) so streaming responses and uploads
+    pass straight through. The Server-Timing header reflects everything up
+    to the first response byte.
+    """
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        body_start = None
+        status = 500
+
+        async def receive_wrapper():
+            nonlocal body_start
+            if body_start is None:
+                body_start = time.perf_counter()
+            message = await receive()
+            if message["type"] == "http.request":
+                stats.body_bytes += len(message.get("body", b""))
+                if not message.get("more_body", False) and stats.body_bytes:
+                    # covers multipart parsing, which runs between receives
+                    stats.add_stage("body", time.perf_counter() - body_start)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    value = stats.server_timing(time.perf_counter() - start)
+                    headers.append((b"server-timing", value.encode("latin-1")))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - start
+            route = _route_label(scope)
+            method = scope.get("method", "")
+            REQUESTS.inc(method=method, route=route, status=str(status))
+            REQUEST_SECONDS.observe(elapsed, method=method, route=route)
+            REQUEST_QUERIES.observe(stats.queries, route=route)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, route=route)
+            if stats.body_bytes:
+                REQUEST_BODY_BYTES.observe(stats.body_bytes, route=route)
+            for stage, seconds in stats.stages.items():
+                STAGE_SECONDS.observe(seconds, route=route, stage=stage)
+
+
+def _hash_stat(key: str):
+    from app.auth import password_hash_stats
+    return password_hash_stats()[key]
+
+
+def _subscribers():
+    from app.events import event_bus
+    return event_bus.subscriber_count
+
+
+Gauge("password_hash_pending", "Password hashes running or queued.", lambda: _hash_stat("pending"))
+Gauge("password_hash_queue_depth", "Password hashes waiting for a worker.", lambda: _hash_stat("queue_depth"))
+Gauge("event_stream_subscribers", "Open /expenses/events streams in this process.", _subscribers)
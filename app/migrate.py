@@ -0,0 +1,72 @@
+# app/migrate.py
+"""
+Brings the database schema up to date:
+
+    python -m app.migrate
+
+Run it once per deploy, before starting workers (the app itself no longer
+creates tables on import). Creates missing tables, then adds nullable
+columns and indexes introduced after a table was first created, and the
+SQLite full-text tables. Safe to re-run.
+"""
+from typing import Callable, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+
+from app import models, search
+from app.database import Base, get_engine
+
+
+def migrate(engine: Optional[Engine] = None, log: Callable[[str], None] = print) -> None:
+    engine = engine or get_engine()
+
+    log("Creating tables...")
+    Base.metadata.create_all(bind=engine)
+
+    # create_all() skips tables that already exist, so add any nullable columns
+    # and indexes that were introduced after the table was first created
+    # (columns with info["backfill_from"] are filled from that column)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                log(f"Adding column {column.name} to {table.name}...")
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                    backfill_from = column.info.get("backfill_from")
+                    if backfill_from:
+                        conn.execute(text(f"UPDATE {table.name} SET {column.name} = {backfill_from}"))
+
+        existing_indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            # dialect-specific indexes (e.g. the MySQL FULLTEXT ones) are skipped elsewhere
+            ddl_if = getattr(index, "_ddl_if", None)
+            if ddl_if is not None and ddl_if.dialect and ddl_if.dialect != engine.dialect.name:
+                continue
+            if index.name not in existing_indexes:
+                log(f"Creating index {index.name} on {table.name}...")
+                index.create(bind=engine)
+
+    expense_models = [models.ExpenseThinksonic, models.ExpenseThinkmachines, models.ExpenseThinkplast]
+    if engine.dialect.name == "sqlite":
+        # rows written before created_at had a fixed text format (see models.ExpenseTimestamp)
+        with engine.begin() as conn:
+            for Model in expense_models:
+                result = conn.execute(text(
+                    f"UPDATE {Model.__tablename__} SET created_at = datetime(created_at) "
+                    f"WHERE created_at IS NOT NULL AND created_at != datetime(created_at)"
+                ))
+                if result.rowcount:
+                    log(f"Normalized created_at on {result.rowcount} rows of {Model.__tablename__}")
+
+    # SQLite files predating search need their FTS5 tables (MySQL uses the FULLTEXT indexes above)
+    search.ensure_sqlite_fts(engine, expense_models)
+    log("Schema up to date!")
+
+
+if __name__ == "__main__":
+    migrate()
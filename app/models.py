@@ -1,6 +1,37 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func, Date
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, func, Date, Index, LargeBinary, Numeric, UniqueConstraint
+from sqlalchemy.dialects import sqlite
 from app.database import Base
+from app.search import attach_sqlite_fts, fulltext_index
+
+# Expense created_at: SQLite keeps DateTime as text and compares it as text, so
+# store it in CURRENT_TIMESTAMP's own format (whole seconds). Server-default
+# rows, explicit values and keyset cursor binds then compare correctly.
+ExpenseTimestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
+
+def _expense_indexes(table: str):
+    # indexes shared by every company expense table
+    return (
+        # keyset pagination: ORDER BY created_at DESC, id DESC
+        Index(f"ix_{table}_created_at_id", "created_at", "id"),
+        # server-side filters on the listing endpoints
+        Index(f"ix_{table}_status_created_at", "status", "created_at", "id"),
+        Index(f"ix_{table}_vendor_date", "vendor_name", "date"),
+        Index(f"ix_{table}_date", "date"),
+        Index(f"ix_{table}_submitted_by_created_at", "submitted_by", "created_at"),
+        Index(f"ix_{table}_type_flags_date", "expense_type_flag", "payment_type_flag", "date"),
+        # amount range filters
+        Index(f"ix_{table}_invoice_amount_value", "invoice_amount_value"),
+        # duplicate invoice probe at ingest, and the flagged-duplicates listing
+        Index(f"ix_{table}_fingerprint", "fingerprint"),
+        Index(f"ix_{table}_duplicate_of", "duplicate_of"),
+        # /expenses/search (MySQL FULLTEXT; SQLite gets an FTS5 table instead)
+        fulltext_index(table),
+    )
 
 class Admin(Base):
     __tablename__ = "admin"
@@ -27,8 +58,67 @@ class Vendor(Base):
     name = Column(String(200), unique=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+# Content-addressed attachment store: one file per distinct SHA-256,
+# shared by every expense row that references its path
+class AttachmentBlob(Base):
+    __tablename__ = "attachment_blob"
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String(1024), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Monthly totals per company/vendor/type, kept up to date by crud so
+# reports read O(groups) rows instead of every expense
+class ExpenseRollup(Base):
+    __tablename__ = "expense_rollup"
+    id = Column(Integer, primary_key=True, index=True)
+    company_name = Column(String(255), nullable=False)
+    month = Column(String(7), nullable=False)  # "YYYY-MM"
+    vendor_name = Column(String(200), nullable=False, default="")
+    expense_type = Column(String(20), nullable=False, default="")
+    payment_type = Column(String(20), nullable=False, default="")
+    expense_count = Column(Integer, nullable=False, default=0)
+    invoice_total = Column(Numeric(16, 2), nullable=False, default=0)
+    paid_total = Column(Numeric(16, 2), nullable=False, default=0)
+    __table_args__ = (
+        UniqueConstraint(
+            "company_name", "month", "vendor_name", "expense_type", "payment_type",
+            name="uq_expense_rollup_group",
+        ),
+        Index("ix_expense_rollup_month", "month"),
+    )
+
+# Issued refresh tokens (see auth_router /refresh); naive UTC timestamps.
+# A token is good once: refreshing marks it rotated and issues the next one
+# in the same family
+class RefreshToken(Base):
+    __tablename__ = "refresh_token"
+    jti = Column(String(32), primary_key=True)
+    family = Column(String(32), nullable=False, index=True)
+    subject = Column(String(255), nullable=False, index=True)  # user/admin email
+    expires_at = Column(DateTime, nullable=False)
+    rotated_at = Column(DateTime, nullable=True)
+    revoked = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Idempotency-Key records for retried POSTs (see app/idempotency.py);
+# naive UTC timestamps
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_key"
+    principal = Column(String(255), primary_key=True)  # token subject (email)
+    key = Column(String(255), primary_key=True)
+    path = Column(String(255), nullable=False)
+    state = Column(String(16), nullable=False, default="pending")  # pending / done
+    status_code = Column(Integer, nullable=True)
+    content_type = Column(String(255), nullable=True)
+    body = Column(LargeBinary, nullable=True)  # raw response bytes, replayed unchanged
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
 class ExpenseThinksonic(Base):
     __tablename__ = "expense_thinksonic"
+    __table_args__ = _expense_indexes(__tablename__)
     id = Column(Integer, primary_key=True, index=True)
     company_name = Column(String(255), nullable=False)
     gst_number = Column(String(64), nullable=True)
@@ -40,6 +130,7 @@ class ExpenseThinksonic(Base):
     invoice_number = Column(String(128), nullable=True)
     vendor_name = Column(String(200), nullable=True)
     invoice_amount = Column(String(50), nullable=True)
+    invoice_amount_value = Column(Numeric(14, 2), nullable=True)  # parsed from invoice_amount
     purpose = Column(String(255), nullable=True)
     purchased_by = Column(String(150), nullable=True)
 
@@ -50,14 +141,26 @@ class ExpenseThinksonic(Base):
     payment_type = Column(String(20), nullable=True)    # "Cash"/"UPI"
     payment_type_flag = Column(Integer, nullable=True)  # 0 -> Cash, 1 -> UPI
     amount_paid = Column(String(50), nullable=True)
+    amount_paid_value = Column(Numeric(14, 2), nullable=True)  # parsed from amount_paid
     payment_screenshot = Column(String(1024), nullable=True)
     submitted_by = Column(String(150), nullable=True)  # username who submitted / last updated
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(ExpenseTimestamp, server_default=func.now())
     status = Column(String(50), default="Pending")
+    # bumped by every update; backs ETag / conditional GET
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # set by the INSERT/UPDATE statements rather than a DDL default, so app.migrate
+    # can add it to existing tables (SQLite rejects non-constant column defaults);
+    # migrate fills existing rows from created_at
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(),
+                        info={"backfill_from": "created_at"})
+    # normalized vendor/invoice number/amount/date hash (see app/duplicates.py)
+    fingerprint = Column(String(64), nullable=True)
+    duplicate_of = Column(String(300), nullable=True)  # "<company>:<id>" of the earlier copy
 
 
 class ExpenseThinkmachines(Base):
     __tablename__ = "expense_thinkmachines"
+    __table_args__ = _expense_indexes(__tablename__)
     id = Column(Integer, primary_key=True, index=True)
     company_name = Column(String(255), nullable=False)
     gst_number = Column(String(64), nullable=True)
@@ -69,6 +172,7 @@ class ExpenseThinkmachines(Base):
     invoice_number = Column(String(128), nullable=True)
     vendor_name = Column(String(200), nullable=True)
     invoice_amount = Column(String(50), nullable=True)
+    invoice_amount_value = Column(Numeric(14, 2), nullable=True)  # parsed from invoice_amount
     purpose = Column(String(255), nullable=True)
     purchased_by = Column(String(150), nullable=True)
 
@@ -79,14 +183,26 @@ class ExpenseThinkmachines(Base):
     payment_type = Column(String(20), nullable=True)
     payment_type_flag = Column(Integer, nullable=True)
     amount_paid = Column(String(50), nullable=True)
+    amount_paid_value = Column(Numeric(14, 2), nullable=True)  # parsed from amount_paid
     payment_screenshot = Column(String(1024), nullable=True)
     submitted_by = Column(String(150), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(ExpenseTimestamp, server_default=func.now())
     status = Column(String(50), default="Pending")
+    # bumped by every update; backs ETag / conditional GET
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # set by the INSERT/UPDATE statements rather than a DDL default, so app.migrate
+    # can add it to existing tables (SQLite rejects non-constant column defaults);
+    # migrate fills existing rows from created_at
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(),
+                        info={"backfill_from": "created_at"})
+    # normalized vendor/invoice number/amount/date hash (see app/duplicates.py)
+    fingerprint = Column(String(64), nullable=True)
+    duplicate_of = Column(String(300), nullable=True)  # "<company>:<id>" of the earlier copy
 
 
 class ExpenseThinkplast(Base):
     __tablename__ = "expense_thinkplast"
+    __table_args__ = _expense_indexes(__tablename__)
     id = Column(Integer, primary_key=True, index=True)
     company_name = Column(String(255), nullable=False)
     gst_number = Column(String(64), nullable=True)
@@ -98,6 +214,7 @@ class ExpenseThinkplast(Base):
     invoice_number = Column(String(128), nullable=True)
     vendor_name = Column(String(200), nullable=True)
     invoice_amount = Column(String(50), nullable=True)
+    invoice_amount_value = Column(Numeric(14, 2), nullable=True)  # parsed from invoice_amount
     purpose = Column(String(255), nullable=True)
     purchased_by = Column(String(150), nullable=True)
 
@@ -108,8 +225,23 @@ class ExpenseThinkplast(Base):
     payment_type = Column(String(20), nullable=True)
     payment_type_flag = Column(Integer, nullable=True)
     amount_paid = Column(String(50), nullable=True)
+    amount_paid_value = Column(Numeric(14, 2), nullable=True)  # parsed from amount_paid
     payment_screenshot = Column(String(1024), nullable=True)
     submitted_by = Column(String(150), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())  
+    created_at = Column(ExpenseTimestamp, server_default=func.now())
     status = Column(String(50), default="Pending")
- 
+    # bumped by every update; backs ETag / conditional GET
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # set by the INSERT/UPDATE statements rather than a DDL default, so app.migrate
+    # can add it to existing tables (SQLite rejects non-constant column defaults);
+    # migrate fills existing rows from created_at
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(),
+                        info={"backfill_from": "created_at"})
+    # normalized vendor/invoice number/amount/date hash (see app/duplicates.py)
+    fingerprint = Column(String(64), nullable=True)
+    duplicate_of = Column(String(300), nullable=True)  # "<company>:<id>" of the earlier copy
+
+
+# SQLite stand-in for the FULLTEXT indexes (see app/search.py)
+for _model in (ExpenseThinksonic, ExpenseThinkmachines, ExpenseThinkplast):
+    attach_sqlite_fts(_model.__table__)
@@ -0,0 +1,161 @@
+# app/reports.py
+from collections import defaultdict
+from decimal import Decimal
+from typing import Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+from app import models
+from app.amounts import parse_amount
+
+Rollup = models.ExpenseRollup
+
+GROUP_COLUMNS = ("company_name", "month", "vendor_name", "expense_type", "payment_type")
+
+# public group_by names -> rollup columns
+GROUP_BY_FIELDS = {
+    "company": "company_name",
+    "month": "month",
+    "vendor": "vendor_name",
+    "expense_type": "expense_type",
+    "payment_type": "payment_type",
+}
+
+
+def _group_key(company_name: str, inst) -> tuple:
+    return (
+        company_name,
+        inst.date.strftime("%Y-%m"),
+        inst.vendor_name or "",
+        inst.expense_type or "",
+        inst.payment_type or "",
+    )
+
+
+def _amounts(inst) -> tuple:
+    # prefer the numeric columns; fall back to parsing rows not yet backfilled
+    invoice = inst.invoice_amount_value
+    if invoice is None:
+        invoice = parse_amount(inst.invoice_amount)
+    paid = inst.amount_paid_value
+    if paid is None:
+        paid = parse_amount(inst.amount_paid)
+    return invoice or Decimal("0"), paid or Decimal("0")
+
+
+class RollupDelta:
+    """
+    Accumulates per-group changes (count, invoice total, paid total) so a
+    batch of expense writes turns into one upsert per touched group.
+    """
+
+    def __init__(self):
+        self.groups = defaultdict(lambda: [0, Decimal("0"), Decimal("0")])
+
+    def add(self, company_name: str, inst, sign: int = 1) -> None:
+        if inst.date is None:
+            return
+        invoice, paid = _amounts(inst)
+        group = self.groups[_group_key(company_name, inst)]
+        group[0] += sign
+        group[1] += sign * invoice
+        group[2] += sign * paid
+
+    def apply(self, db: Session) -> None:
+        """Adds the accumulated deltas to expense_rollup (left for the caller's commit)."""
+        for key, (count, invoice, paid) in self.groups.items():
+            if count == 0 and invoice == 0 and paid == 0:
+                continue
+            _upsert(db, dict(zip(GROUP_COLUMNS, key)), count, invoice, paid)
+        self.groups.clear()
+
+
+def _upsert(db: Session, key: dict, count: int, invoice: Decimal, paid: Decimal) -> None:
+    values = dict(key, expense_count=count, invoice_total=invoice, paid_total=paid)
+    table = Rollup.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        stmt = mysql.insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(
+            expense_count=table.c.expense_count + stmt.inserted.expense_count,
+            invoice_total=table.c.invoice_total + stmt.inserted.invoice_total,
+            paid_total=table.c.paid_total + stmt.inserted.paid_total,
+        )
+        db.execute(stmt)
+        return
+
+    if dialect == "sqlite":
+        stmt = sqlite.insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(GROUP_COLUMNS),
+            set_={
+                "expense_count": table.c.expense_count + stmt.excluded.expense_count,
+                "invoice_total": table.c.invoice_total + stmt.excluded.invoice_total,
+                "paid_total": table.c.paid_total + stmt.excluded.paid_total,
+            },
+        )
+        db.execute(stmt)
+        return
+
+    row = db.query(Rollup).filter_by(**key).with_for_update().first()
+    if row is None:
+        db.add(Rollup(**values))
+    else:
+        row.expense_count = Rollup.expense_count + count
+        row.invoice_total = Rollup.invoice_total + invoice
+        row.paid_total = Rollup.paid_total + paid
+
+
+def rebuild_rollups(db: Session, company_models: dict, batch_size: int = 5000) -> int:
+    """
+    Recomputes expense_rollup from scratch in one transaction. Returns the
+    number of groups.
+
+    Safe while the API is taking writes: the rollup rows are deleted (and so
+    locked) before the expense tables are read. A write that commits before
+    that is in the scan; any later write blocks on its rollup upsert until
+    the rebuild commits, then adds its delta to the rebuilt totals. Writers
+    wait for the length of the rebuild (on SQLite the whole database is
+    locked, so they may time out with "database is locked").
+    """
+    db.query(Rollup).delete()
+    delta = RollupDelta()
+    for company_name, Model in company_models.items():
+        columns = (Model.date, Model.vendor_name, Model.expense_type, Model.payment_type,
+                   Model.invoice_amount, Model.invoice_amount_value,
+                   Model.amount_paid, Model.amount_paid_value)
+        for row in db.query(*columns).yield_per(batch_size):
+            delta.add(company_name, row)
+    groups = len(delta.groups)
+    delta.apply(db)
+    db.commit()
+    return groups
+
+
+def summarize(
+    db: Session,
+    group_by: Iterable[str],
+    company_names: Optional[List[str]] = None,
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None,
+) -> List[dict]:
+    columns = [getattr(Rollup, GROUP_BY_FIELDS[g]) for g in group_by]
+    q = db.query(
+        *columns,
+        func.sum(Rollup.expense_count).label("expense_count"),
+        func.sum(Rollup.invoice_total).label("invoice_total"),
+        func.sum(Rollup.paid_total).label("paid_total"),
+    )
+    if company_names:
+        q = q.filter(Rollup.company_name.in_(company_names))
+    if month_from:
+        q = q.filter(Rollup.month >= month_from)
+    if month_to:
+        q = q.filter(Rollup.month <= month_to)
+    if columns:
+        q = q.group_by(*columns).order_by(*columns)
+    q = q.having(func.sum(Rollup.expense_count) > 0)
+    return [dict(row._mapping) for row in q.all()]
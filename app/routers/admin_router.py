@@ -18,7 +18,7 @@ def get_admin_from_token(
     db: Session = Depends(get_db)
 ):
     try:
-        payload = auth.decode_token(token)
+        payload = auth.decode_access_token(token)
 
         # Validate admin role
         if payload.get("role") != "admin":
@@ -79,3 +79,11 @@ def delete_user(
     if not ok:
         raise HTTPException(status_code=404, detail="User not found")
     return {"detail": "User deleted"}
+
+
+# ---------------------------------------------------------
+# PASSWORD HASHING POOL STATS (Admin only)
+# ---------------------------------------------------------
+@router.get("/stats/password-hashing")
+def password_hashing_stats(current_admin = Depends(get_admin_from_token)):
+    return auth.password_hash_stats()
@@ -1,44 +1,125 @@
 # app/routers/auth_router.py
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from jose import JWTError
 from app import schemas, crud, auth
+from app.cache import principal_cache, revoked_tokens
+from app.config import settings
 from app.deps import get_db
-from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 router = APIRouter(tags=["auth"])
+optional_bearer = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+
+def _hasher_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+def _issue_tokens(db: Session, email: str, role: str, family: str = None) -> dict:
+    access = auth.create_access_token({"sub": email, "role": role, "email": email})
+    refresh, jti, family, expires_at = auth.create_refresh_token(email, role, family)
+    crud.create_refresh_token_record(db, jti, family, email, expires_at)
+    return {
+        "access_token": access,
+        "token_type": "bearer",
+        "role": role,
+        "refresh_token": refresh,
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
 
 @router.post("/register", response_model=schemas.UserOut)
-def register(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = crud.get_user_by_email(db, user_in.email)
+async def register(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+    # async for the Argon2 pool; DB calls still go to the threadpool
+    existing = await run_in_threadpool(crud.get_user_by_email, db, user_in.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed = auth.hash_password(user_in.password)
-    user = crud.create_user(db, user_in.username, user_in.email, hashed)
+    try:
+        hashed = await auth.hash_password_async(user_in.password)
+    except auth.PasswordHasherBusy:
+        raise _hasher_busy()
+    user = await run_in_threadpool(crud.create_user, db, user_in.username, user_in.email, hashed)
     # user is created with approved=False by default
     return user
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     # OAuth2PasswordRequestForm uses fields: username, password
     email = form_data.username
     password = form_data.password
 
-    # Check admin first
-    admin = crud.get_admin_by_email(db, email)
-    if admin and auth.verify_password(password, admin.password_hash):
-        token = auth.create_access_token({"sub": str(admin.email), "role": "admin", "email": admin.email})
-        return {"access_token": token, "token_type": "bearer", "role": "admin"}
+    try:
+        # Check admin first
+        admin = await run_in_threadpool(crud.get_admin_by_email, db, email)
+        if admin and await auth.verify_password_async(password, admin.password_hash):
+            return await run_in_threadpool(_issue_tokens, db, str(admin.email), "admin")
 
-    # Then user
-    user = crud.get_user_by_email(db, email)
-    if not user:
-        raise HTTPException(status_code=400, detail="Invalid credentials")
+        # Then user
+        user = await run_in_threadpool(crud.get_user_by_email, db, email)
+        if not user:
+            raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    if not auth.verify_password(password, user.password_hash):
-        raise HTTPException(status_code=400, detail="Invalid credentials")
+        if not await auth.verify_password_async(password, user.password_hash):
+            raise HTTPException(status_code=400, detail="Invalid credentials")
+    except auth.PasswordHasherBusy:
+        raise _hasher_busy()
 
     if not user.approved:
         raise HTTPException(status_code=403, detail="User not approved by admin")
 
-    token = auth.create_access_token({"sub": str(user.email), "role": "user", "email": user.email})
-    return {"access_token": token, "token_type": "bearer", "role": "user"}
+    return await run_in_threadpool(_issue_tokens, db, str(user.email), "user")
+
+
+# Exchange a refresh token for a new access + refresh pair (no password, no Argon2).
+# Each refresh token works once; replaying a used one revokes that login's tokens.
+@router.post("/refresh", response_model=schemas.Token)
+def refresh(body: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    try:
+        payload = auth.decode_refresh_token(body.refresh_token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+    if not crud.rotate_refresh_token(db, payload["jti"]):
+        raise HTTPException(status_code=401, detail="Refresh token is no longer valid")
+
+    email, role = payload.get("sub"), payload.get("role")
+    if role == "admin":
+        principal_ok = crud.get_admin_by_email(db, email) is not None
+    else:
+        user = crud.get_user_by_email(db, email)
+        principal_ok = user is not None and user.approved
+    if not principal_ok:
+        crud.revoke_refresh_family(db, payload["fam"])
+        raise HTTPException(status_code=401, detail="Refresh token is no longer valid")
+
+    return _issue_tokens(db, email, role, family=payload["fam"])
+
+
+# Ends this device session: the refresh token's family and the presented access token
+@router.post("/logout")
+def logout(
+    body: Optional[schemas.LogoutRequest] = None,
+    token: Optional[str] = Depends(optional_bearer),
+    db: Session = Depends(get_db),
+):
+    if body and body.refresh_token:
+        try:
+            crud.revoke_refresh_family(db, auth.decode_refresh_token(body.refresh_token)["fam"])
+        except JWTError:
+            pass
+    if token:
+        try:
+            payload = auth.decode_access_token(token)
+            revoked_tokens.revoke_jti(payload["jti"], payload["exp"])
+        except (JWTError, KeyError):
+            pass
+        principal_cache.delete(token)
+    return {"detail": "Logged out"}
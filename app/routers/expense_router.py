@@ -1,57 +1,140 @@
 # app/routers/expense_router.py
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import mimetypes
 import os
+import re
+import tempfile
 import traceback
-from datetime import datetime
+from datetime import datetime, date as date_type, timezone
+from email.utils import format_datetime
+from decimal import Decimal
 from typing import Optional, List
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, Form, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
 
 # define router early so it's present even if later imports throw
 router = APIRouter(tags=["expenses"])
 
 # --- safe imports (wrapped for clearer error messages) ---
 try:
-    from app.deps import get_db, get_current_user
-    from app import crud
+    from app.deps import get_db, get_async_db, get_current_user
+    from app.database import SessionLocal
+    from app import crud, crud_async
     from app import schemas_expenses
+    from app import duplicates, metrics, search, storage, thumbnails
+    from app.amounts import MAX_INTEGER_DIGITS, parse_amount
+    from app.vendor_index import vendor_index
+    from app.events import event_bus
+    from app.config import settings
 except Exception:
     # print a friendly import-time traceback and re-raise so the console shows the real error
     print("Error importing dependencies for expense_router.py:")
     traceback.print_exc()
     raise
 
-# configure upload dirs
-BASE_UPLOAD_DIR = "uploads"
-INVOICE_DIR = os.path.join(BASE_UPLOAD_DIR, "invoices")
-QRCODE_DIR = os.path.join(BASE_UPLOAD_DIR, "qrcodes")
-SCREENSHOT_DIR = os.path.join(BASE_UPLOAD_DIR, "screenshots")
+# upload dirs are created at startup (storage.ensure_upload_dirs)
+BASE_UPLOAD_DIR = storage.UPLOAD_DIR
 
-for d in (INVOICE_DIR, QRCODE_DIR, SCREENSHOT_DIR):
-    os.makedirs(d, exist_ok=True)
 
+async def save_upload_file(
+    upload_file: UploadFile,
+    db: Session,
+    background_tasks: Optional[BackgroundTasks] = None,
+) -> Optional[str]:
+    """
+    Streams the upload into the content-addressed store and returns its path.
+    Identical files share one blob; the reference is committed with the expense.
+    When background_tasks is given, a WebP thumbnail is built after the response.
+    """
+    try:
+        with metrics.timed("upload"):
+            path = await storage.store_upload(db, upload_file)
+    except storage.UploadTooLarge:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{upload_file.filename} exceeds the {settings.UPLOAD_MAX_BYTES} byte upload limit",
+        )
+    if path:
+        metrics.UPLOAD_BYTES.inc(upload_file.size or 0)
+        if background_tasks is not None:
+            background_tasks.add_task(thumbnails.generate_thumbnail, path)
+    return path
 
-def save_upload_file(upload_file: UploadFile, folder: str) -> Optional[str]:
-    if not upload_file:
-        return None
-    filename = getattr(upload_file, "filename", None)
-    if not filename:
+
+def _check_amount(field: str, value: Optional[str]) -> None:
+    if value is not None and value.strip() and parse_amount(value) is None:
+        raise HTTPException(status_code=400, detail=f"Invalid {field}, expected a number below 10^{MAX_INTEGER_DIGITS}")
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _expense_etag(company_name: str, expense_id: int, version) -> str:
+    table = crud.get_model_for_company(company_name).__tablename__
+    return f'"{table}-{expense_id}-{version or 1}"'
+
+
+def _list_etag(rows) -> str:
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(f"{row.id}:{row.version or 1};".encode())
+    return f'"list-{digest.hexdigest()}"'
+
+
+def _http_date(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
         return None
-    ext = os.path.splitext(filename)[1]
-    safe_name = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{os.urandom(6).hex()}{ext}"
-    dest = os.path.join(folder, safe_name)
-    # make sure parent folder exists
-    os.makedirs(os.path.dirname(dest), exist_ok=True)
-    # read and write safely
-    content = upload_file.file.read()
-    with open(dest, "wb") as f:
-        f.write(content)
-    return dest  # you can change to store relative paths if you prefer
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # DB timestamps are stored in UTC
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+# shared listing filters (query params), pushed down to SQL by crud
+def expense_filters(
+    status: Optional[str] = None,
+    date_from: Optional[date_type] = None,
+    date_to: Optional[date_type] = None,
+    vendor_name: Optional[str] = None,
+    expense_type_flag: Optional[int] = Query(None, ge=0, le=1),
+    payment_type_flag: Optional[int] = Query(None, ge=0, le=1),
+    submitted_by: Optional[str] = None,
+    min_amount: Optional[Decimal] = Query(None, ge=0),
+    max_amount: Optional[Decimal] = Query(None, ge=0),
+    duplicate: Optional[bool] = Query(None, description="true: only rows flagged as duplicate invoices"),
+) -> dict:
+    filters = {
+        "status": status,
+        "date_from": date_from,
+        "date_to": date_to,
+        "vendor_name": vendor_name,
+        "expense_type_flag": expense_type_flag,
+        "payment_type_flag": payment_type_flag,
+        "submitted_by": submitted_by,
+        "min_amount": min_amount,
+        "max_amount": max_amount,
+        "duplicate": duplicate,
+    }
+    return {k: v for k, v in filters.items() if v is not None}
 
 
 # CREATE EXPENSE - accepts form-data, files optional
 @router.post("/create", response_model=schemas_expenses.ExpenseOut)
 async def create_expense(
+    background_tasks: BackgroundTasks,
     company_name: str = Form(...),
     gst_number: str = Form(None),
     expense_type: str = Form(...),  # "Purchase" or "Others"
@@ -68,6 +151,8 @@ async def create_expense(
 
     # NEW: accept optional status from client (Completed/Pending)
     status: Optional[str] = Form(None),
+    # insert even if the same invoice already exists (DUPLICATE_INVOICE_POLICY=reject)
+    allow_duplicate: bool = Form(False),
 
     invoice_copy: Optional[UploadFile] = File(None),
     qrcode: Optional[UploadFile] = File(None),
@@ -110,9 +195,12 @@ async def create_expense(
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid date format, use YYYY-MM-DD or DD-MM-YYYY")
 
-    invoice_path = save_upload_file(invoice_copy, INVOICE_DIR) if invoice_copy else None
-    qrcode_path = save_upload_file(qrcode, QRCODE_DIR) if qrcode else None
-    screenshot_path = save_upload_file(payment_screenshot, SCREENSHOT_DIR) if payment_screenshot else None
+    _check_amount("invoice_amount", invoice_amount)
+    _check_amount("amount_paid", amount_paid)
+
+    invoice_path = await save_upload_file(invoice_copy, db, background_tasks) if invoice_copy else None
+    qrcode_path = await save_upload_file(qrcode, db, background_tasks) if qrcode else None
+    screenshot_path = await save_upload_file(payment_screenshot, db, background_tasks) if payment_screenshot else None
 
     submitted_by = getattr(current_user, "username", None)
 
@@ -141,34 +229,413 @@ async def create_expense(
     if status is not None:
         payload["status"] = status
 
-    inst = crud.create_expense(db, company_name, payload)
+    try:
+        inst = await run_in_threadpool(crud.create_expense, db, company_name, payload, allow_duplicate)
+    except duplicates.DuplicateExpense as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "This invoice was already submitted", "duplicate_of": e.matches},
+        )
     return inst
 
 
 # LIST EXPENSES FOR COMPANY
 @router.get("/company/{company_name}", response_model=List[schemas_expenses.ExpenseOut])
-def list_company_expenses(
+async def list_company_expenses(
+    request: Request,
+    response: Response,
     company_name: str,
     skip: int = 0, limit: int = 100,
+    sort: Optional[str] = Query(None, description="created_at, date, vendor_name, status or invoice_number; prefix with - for descending"),
+    filters: dict = Depends(expense_filters),
     db: Session = Depends(get_db),
+    adb = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
-    insts = crud.list_expenses_for_company(db, company_name, limit=limit, skip=skip)
+    try:
+        # conditional GET: compare against (id, version) pairs only
+        if request.headers.get("if-none-match"):
+            if adb is not None:
+                versions = await crud_async.list_expense_versions(adb, company_name, limit=limit, skip=skip, filters=filters, sort=sort)
+            else:
+                versions = await run_in_threadpool(
+                    crud.list_expense_versions, db, company_name, limit=limit, skip=skip, filters=filters, sort=sort
+                )
+            etag = _list_etag(versions)
+            if _etag_matches(request, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+
+        if adb is not None:
+            insts = await crud_async.list_expenses_for_company(adb, company_name, limit=limit, skip=skip, filters=filters, sort=sort)
+        else:
+            insts = await run_in_threadpool(
+                crud.list_expenses_for_company, db, company_name, limit=limit, skip=skip, filters=filters, sort=sort
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["ETag"] = _list_etag(insts)
+    response.headers["Cache-Control"] = "private, no-cache"
     return insts
 
 
+# LIST EXPENSES FOR COMPANY - cursor mode (constant cost per page)
+@router.get("/company/{company_name}/page", response_model=schemas_expenses.ExpensePage)
+async def list_company_expenses_page(
+    company_name: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    filters: dict = Depends(expense_filters),
+    db: Session = Depends(get_db),
+    adb = Depends(get_async_db),
+    current_user = Depends(get_current_user)
+):
+    if not crud.get_model_for_company(company_name):
+        raise HTTPException(status_code=400, detail="Unknown company")
+    try:
+        if adb is not None:
+            items, next_cursor = await crud_async.list_expenses_page(adb, company_name, limit=limit, cursor=cursor, filters=filters)
+        else:
+            items, next_cursor = await run_in_threadpool(
+                crud.list_expenses_page, db, company_name, limit=limit, cursor=cursor, filters=filters
+            )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"items": items, "next_cursor": next_cursor}
+
+
+# LIST EXPENSES ACROSS ALL COMPANIES - merged and paged in one query
+@router.get("/all", response_model=schemas_expenses.ExpensePage)
+def list_all_expenses(
+    company_name: Optional[List[str]] = Query(None, description="Restrict to these companies; omit for all"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    filters: dict = Depends(expense_filters),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    for name in company_name or []:
+        if not crud.get_model_for_company(name):
+            raise HTTPException(status_code=400, detail=f"Unknown company: {name}")
+    try:
+        items, next_cursor = crud.list_expenses_all_companies(
+            db, limit=limit, cursor=cursor, filters=filters, company_names=company_name
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"items": items, "next_cursor": next_cursor}
+
+
+# FULL-TEXT SEARCH over purpose, vendor, invoice number and GST number
+@router.get("/search", response_model=schemas_expenses.ExpenseSearchPage)
+def search_expenses(
+    q: str = Query(..., min_length=1, max_length=200),
+    company_name: Optional[List[str]] = Query(None, description="Restrict to these companies; omit for all"),
+    limit: int = Query(20, ge=1, le=100),
+    skip: int = Query(0, ge=0, le=1000),
+    filters: dict = Depends(expense_filters),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    if not search.is_supported(db):
+        # no full-text index on this database backend
+        raise HTTPException(status_code=501, detail=f"full-text search is not available on {db.get_bind().dialect.name}")
+    company_models = {}
+    for name in company_name or list(crud._company_model_map):
+        Model = crud.get_model_for_company(name)
+        if not Model:
+            raise HTTPException(status_code=400, detail=f"Unknown company: {name}")
+        company_models[name] = Model
+
+    hits, has_more = search.search_expenses(db, q, company_models, limit=limit, skip=skip, filters=filters)
+    items = [
+        dict(schemas_expenses.ExpenseOut.from_orm(inst).dict(), score=score)
+        for _, inst, score in hits
+    ]
+    return {"items": items, "next_skip": skip + limit if has_more else None}
+
+
+# ---------------------------------------------------------
+# EXPORT (CSV streamed row by row, XLSX via write-only workbook)
+# ---------------------------------------------------------
+def _export_csv(company_names: List[str], filters: dict):
+    # own session: the request-scoped one is closed before the body streams
+    db = SessionLocal()
+    try:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(crud.EXPORT_COLUMNS)
+        for row in crud.iter_expense_rows(db, company_names, filters):
+            writer.writerow(row)
+            if buf.tell() >= 64 * 1024:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+    finally:
+        db.close()
+
+
+def _export_xlsx(company_names: List[str], filters: dict) -> str:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Expenses")
+    ws.append(crud.EXPORT_COLUMNS)
+    db = SessionLocal()
+    try:
+        for row in crud.iter_expense_rows(db, company_names, filters):
+            ws.append(row)
+    finally:
+        db.close()
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    wb.save(path)
+    return path
+
+
+@router.get("/export")
+async def export_expenses(
+    company_name: Optional[List[str]] = Query(None, description="Repeat for several companies; omit for all"),
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    filters: dict = Depends(expense_filters),
+    current_user = Depends(get_current_user)
+):
+    company_names = company_name or list(crud._company_model_map)
+    for name in company_names:
+        if not crud.get_model_for_company(name):
+            raise HTTPException(status_code=400, detail=f"Unknown company: {name}")
+
+    filename = f"expenses-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+    if format == "csv":
+        return StreamingResponse(
+            _export_csv(company_names, filters),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=400, detail="XLSX export is not available, install openpyxl")
+    path = await run_in_threadpool(_export_xlsx, company_names, filters)
+    return FileResponse(
+        path,
+        filename=filename,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        background=BackgroundTask(os.remove, path),
+    )
+
+
+# ---------------------------------------------------------
+# BULK IMPORT (CSV with a header row, or JSON lines)
+# ---------------------------------------------------------
+def _parse_date_value(value):
+    # same formats as the create form: YYYY-MM-DD or DD-MM-YYYY
+    if not isinstance(value, str):
+        return value
+    try:
+        return datetime.fromisoformat(value.strip()).date()
+    except ValueError:
+        try:
+            return datetime.strptime(value.strip(), "%d-%m-%Y").date()
+        except ValueError:
+            return value  # let ExpenseCreate report it
+
+
+def _read_import_rows(upload_file: UploadFile, fmt: str):
+    """Yields (row dict, None) or (None, parse error) per data row."""
+    text = io.TextIOWrapper(upload_file.file, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for row in csv.DictReader(text):
+            yield {k.strip(): ((v.strip() or None) if isinstance(v, str) else v) for k, v in row.items() if k}, None
+        return
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line), None
+        except ValueError as e:
+            yield None, f"could not parse row: {e}"
+
+
+def _import_payload(company_name: str, row: dict, submitted_by: Optional[str]) -> dict:
+    data = schemas_expenses.ExpenseCreate(
+        **dict(row, company_name=company_name, date=_parse_date_value(row.get("date")))
+    )
+    purchase = data.expense_type.lower() == "purchase"
+    payment_type = (data.payment_type or "").lower()
+    return {
+        "company_name": company_name,
+        "gst_number": data.gst_number,
+        "expense_type": "Purchase" if purchase else "Others",
+        "expense_type_flag": 0 if purchase else 1,
+        "date": data.date,
+        "invoice_number": data.invoice_number,
+        "vendor_name": data.vendor_name,
+        "invoice_amount": data.invoice_amount,
+        "purpose": data.purpose,
+        "purchased_by": data.purchased_by,
+        "invoice_copy": None,
+        "qrcode": None,
+        "amount_paid_by": data.amount_paid_by,
+        "payment_type": {"cash": "Cash", "upi": "UPI"}.get(payment_type),
+        "payment_type_flag": {"cash": 0, "upi": 1}.get(payment_type),
+        "amount_paid": data.amount_paid,
+        "payment_screenshot": None,
+        "submitted_by": submitted_by,
+        "status": row.get("status") or "Pending",
+    }
+
+
+def _run_import(db: Session, company_name: str, upload_file: UploadFile, fmt: str,
+                batch_size: int, submitted_by: Optional[str]) -> dict:
+    payloads, row_numbers, errors = [], [], []
+    total = 0
+    try:
+        for total, (row, parse_error) in enumerate(_read_import_rows(upload_file, fmt), start=1):
+            if parse_error:
+                errors.append({"row": total, "errors": [parse_error]})
+                continue
+            try:
+                payloads.append(_import_payload(company_name, row, submitted_by))
+                row_numbers.append(total)
+            except ValidationError as e:
+                errors.append({"row": total, "errors": [
+                    f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                ]})
+            except (TypeError, AttributeError):
+                errors.append({"row": total, "errors": ["row must be an object of expense fields"]})
+    except (UnicodeDecodeError, csv.Error) as e:
+        # broken file structure: report where reading stopped
+        errors.append({"row": total + 1, "errors": [f"could not read file: {e}"]})
+
+    failures = crud.bulk_create_expenses(db, company_name, payloads, batch_size=batch_size)
+    for index, message in failures:
+        errors.append({"row": row_numbers[index], "errors": [message]})
+
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "total": total,
+        "inserted": len(payloads) - len(failures),
+        "failed": len(errors),
+        "errors": errors,
+    }
+
+
+@router.post("/import/{company_name}", response_model=schemas_expenses.ExpenseImportResult)
+async def import_expenses(
+    company_name: str,
+    file: UploadFile = File(..., description="CSV with a header row, or JSON lines"),
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$", description="Defaults from the file extension"),
+    batch_size: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    if not crud.get_model_for_company(company_name):
+        raise HTTPException(status_code=400, detail="Unknown company")
+    fmt = format or ("jsonl" if (file.filename or "").lower().endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    submitted_by = getattr(current_user, "username", None)
+    return await run_in_threadpool(_run_import, db, company_name, file, fmt, batch_size, submitted_by)
+
+
+# ---------------------------------------------------------
+# CHANGE FEED (server-sent events) - replaces list polling
+# ---------------------------------------------------------
+@router.get("/events")
+async def expense_events(
+    request: Request,
+    company_name: Optional[List[str]] = Query(None, description="Only events for these companies; omit for all"),
+    current_user = Depends(get_current_user)
+):
+    for name in company_name or []:
+        if not crud.get_model_for_company(name):
+            raise HTTPException(status_code=400, detail=f"Unknown company: {name}")
+    companies = set(company_name or [])
+
+    async def stream():
+        async with event_bus.subscribe() as queue:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.EVENT_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if companies and event.get("company_name") not in companies:
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# VENDOR AUTOCOMPLETE (declared before /{company_name}/{expense_id})
+@router.get("/vendor/autocomplete", response_model=List[schemas_expenses.VendorOut])
+def autocomplete_vendors(
+    request: Request,
+    response: Response,
+    prefix: str = Query("", max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    vendor_index.ensure_fresh(db)
+    etag = vendor_index.etag
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return vendor_index.search(prefix, limit)
+
+
 # GET single expense
 @router.get("/{company_name}/{expense_id}", response_model=schemas_expenses.ExpenseOut)
-def get_expense_detail(company_name: str, expense_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    inst = crud.get_expense(db, company_name, expense_id)
+async def get_expense_detail(
+    request: Request,
+    response: Response,
+    company_name: str,
+    expense_id: int,
+    db: Session = Depends(get_db),
+    adb = Depends(get_async_db),
+    current_user = Depends(get_current_user)
+):
+    # conditional GET: a version-only lookup decides 304 before loading the row
+    if request.headers.get("if-none-match") and crud.get_model_for_company(company_name):
+        if adb is not None:
+            current = await crud_async.get_expense_version(adb, company_name, expense_id)
+        else:
+            current = await run_in_threadpool(crud.get_expense_version, db, company_name, expense_id)
+        if current is not None:
+            etag = _expense_etag(company_name, expense_id, current.version)
+            if _etag_matches(request, etag):
+                headers = {"ETag": etag}
+                last_modified = _http_date(current.updated_at or current.created_at)
+                if last_modified:
+                    headers["Last-Modified"] = last_modified
+                return Response(status_code=304, headers=headers)
+
+    if adb is not None:
+        inst = await crud_async.get_expense(adb, company_name, expense_id)
+    else:
+        inst = await run_in_threadpool(crud.get_expense, db, company_name, expense_id)
     if not inst:
         raise HTTPException(status_code=404, detail="Expense not found")
+
+    response.headers["ETag"] = _expense_etag(company_name, expense_id, inst.version)
+    last_modified = _http_date(inst.updated_at or inst.created_at)
+    if last_modified:
+        response.headers["Last-Modified"] = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
     return inst
 
 
 # UPDATE expense - Admin only
 @router.put("/{company_name}/{expense_id}", response_model=schemas_expenses.ExpenseOut)
 async def update_expense(
+    background_tasks: BackgroundTasks,
     company_name: str,
     expense_id: int,
     expense_type: Optional[str] = Form(None),
@@ -199,7 +666,7 @@ async def update_expense(
     if hasattr(current_user, "approved"):
         raise HTTPException(status_code=403, detail="Admin privileges required")
 
-    inst = crud.get_expense(db, company_name, expense_id)
+    inst = await run_in_threadpool(crud.get_expense, db, company_name, expense_id)
     if not inst:
         raise HTTPException(status_code=404, detail="Expense not found")
 
@@ -226,6 +693,9 @@ async def update_expense(
                 raise HTTPException(status_code=400, detail="Invalid date format")
         changes["date"] = dt
 
+    _check_amount("invoice_amount", invoice_amount)
+    _check_amount("amount_paid", amount_paid)
+
     for local_field in ("invoice_number", "vendor_name", "invoice_amount", "purpose", "purchased_by", "amount_paid", "amount_paid_by"):
         val = locals().get(local_field)
         if val is not None:
@@ -241,15 +711,15 @@ async def update_expense(
 
     # handle files
     if invoice_copy is not None:
-        path = save_upload_file(invoice_copy, INVOICE_DIR)
+        path = await save_upload_file(invoice_copy, db, background_tasks)
         if path:
             changes["invoice_copy"] = path
     if qrcode is not None:
-        path = save_upload_file(qrcode, QRCODE_DIR)
+        path = await save_upload_file(qrcode, db, background_tasks)
         if path:
             changes["qrcode"] = path
     if payment_screenshot is not None:
-        path = save_upload_file(payment_screenshot, SCREENSHOT_DIR)
+        path = await save_upload_file(payment_screenshot, db, background_tasks)
         if path:
             changes["payment_screenshot"] = path
 
@@ -263,12 +733,39 @@ async def update_expense(
     if admin_username:
         changes["submitted_by"] = admin_username
 
-    updated = crud.update_expense(db, company_name, expense_id, changes)
+    updated = await run_in_threadpool(crud.update_expense, db, company_name, expense_id, changes)
     if not updated:
         raise HTTPException(status_code=500, detail="Failed to update")
     return updated
 
 
+# BATCH STATUS CHANGE - Admin only
+@router.post("/batch/status", response_model=schemas_expenses.ExpenseStatusBatchResult)
+def batch_update_status(
+    body: schemas_expenses.ExpenseStatusBatch,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    if hasattr(current_user, "approved"):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+
+    if body.company_name:
+        if not crud.get_model_for_company(body.company_name):
+            raise HTTPException(status_code=400, detail="Unknown company")
+        company_names = [body.company_name]
+    else:
+        company_names = list(crud._company_model_map)
+
+    filters = body.filters.dict(exclude_none=True) if body.filters else None
+    counts = crud.batch_update_status(
+        db, company_names, body.status,
+        submitted_by=getattr(current_user, "username", None),
+        ids=body.ids,
+        filters=filters,
+    )
+    return {"status": body.status, "updated": counts, "total": sum(counts.values())}
+
+
 # DELETE expense - Admin only
 @router.delete("/{company_name}/{expense_id}")
 def delete_expense(company_name: str, expense_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
@@ -291,8 +788,15 @@ def add_vendor(v: schemas_expenses.VendorCreate, db: Session = Depends(get_db),
     return created
 
 @router.get("/vendor", response_model=List[schemas_expenses.VendorOut])
-def list_vendors(db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    return crud.get_all_vendors(db)
+def list_vendors(request: Request, response: Response, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+    # served from the in-memory vendor index, revalidated with ETag
+    vendor_index.ensure_fresh(db)
+    etag = vendor_index.etag
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return vendor_index.all()
 
 
 # ---------------------------------------------------------
@@ -314,4 +818,158 @@ def get_expense_files(
         "invoice_copy": inst.invoice_copy,
         "qrcode": inst.qrcode,
         "payment_screenshot": inst.payment_screenshot,
+        # authenticated, cacheable download URLs for the same files
+        "urls": {
+            field: _versioned_url(f"/expenses/{company_name}/{expense_id}/files/{field}", getattr(inst, field))
+            for field in storage.ATTACHMENT_FIELDS
+            if getattr(inst, field)
+        },
+        # small WebP previews, listed once the background job has written them
+        "thumbnails": {
+            field: _versioned_url(f"/expenses/{company_name}/{expense_id}/files/{field}/thumbnail",
+                                  getattr(inst, field))
+            for field in storage.ATTACHMENT_FIELDS
+            if getattr(inst, field) and os.path.exists(storage.thumbnail_path(getattr(inst, field)))
+        },
+    }
+
+
+def _versioned_url(url: str, path: str) -> str:
+    # ?v=<sha256> makes the URL content-addressed, so it can be cached as immutable
+    sha256 = storage.blob_hash(path)
+    return f"{url}?v={sha256}" if sha256 else url
+
+
+# ---------------------------------------------------------
+# DOWNLOAD ATTACHMENT (auth, ETag, Range, sendfile when the server supports it)
+# ---------------------------------------------------------
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: Optional[str], size: int):
+    """(start, end) for a single satisfiable byte range, None to send it all, or ValueError."""
+    if not header:
+        return None
+    m = _RANGE.match(header.strip())
+    if not m:
+        return None  # multi-range or malformed: ignore and send the whole file
+    first, last = m.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+
+def _iter_file_range(path: str, start: int, end: int, chunk_size: int = 256 * 1024):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _attachment_path(db: Session, company_name: str, expense_id: int, field: str) -> str:
+    if field not in storage.ATTACHMENT_FIELDS:
+        raise HTTPException(status_code=404, detail="Unknown attachment")
+    inst = crud.get_expense(db, company_name, expense_id)
+    if not inst:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    path = getattr(inst, field)
+    if not path or not os.path.normpath(path).startswith(BASE_UPLOAD_DIR + os.sep):
+        raise HTTPException(status_code=404, detail="File not found")
+    return path
+
+
+def _file_response(request: Request, path: str, sha256: Optional[str], immutable: bool = False):
+    """
+    immutable=True only when the request URL names the content (?v=<sha256>);
+    the plain expense/field URL changes content when the attachment is
+    replaced, so it is always revalidated against the ETag.
+    """
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    stat = os.stat(path)
+    etag = f'"{sha256}"' if sha256 else f'W/"{int(stat.st_mtime)}-{stat.st_size}"'
+    cache_control = "private, max-age=31536000, immutable" if sha256 and immutable else "private, no-cache"
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        "Last-Modified": _http_date(datetime.fromtimestamp(stat.st_mtime, timezone.utc)),
     }
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    filename = os.path.basename(path)
+
+    # If-Range: only honour Range when the client's copy is still current
+    if_range = request.headers.get("if-range")
+    range_header = request.headers.get("range") if not if_range or if_range == etag else None
+    try:
+        byte_range = _parse_range(range_header, stat.st_size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+
+    if byte_range is None:
+        # FileResponse uses the ASGI pathsend extension (zero-copy) when the server offers it
+        return FileResponse(
+            path, media_type=media_type, headers=headers,
+            filename=filename, content_disposition_type="inline",
+        )
+
+    start, end = byte_range
+    headers.update({
+        "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": f'inline; filename="{filename}"',
+    })
+    return StreamingResponse(
+        _iter_file_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+@router.get("/{company_name}/{expense_id}/files/{field}")
+def download_expense_file(
+    request: Request,
+    company_name: str,
+    expense_id: int,
+    field: str,
+    v: Optional[str] = Query(None, description="content hash from /files; makes the response immutable"),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user),
+):
+    path = _attachment_path(db, company_name, expense_id, field)
+    sha256 = storage.blob_hash(path)
+    return _file_response(request, path, sha256, immutable=v is not None and v == sha256)
+
+
+@router.get("/{company_name}/{expense_id}/files/{field}/thumbnail")
+def download_expense_thumbnail(
+    request: Request,
+    company_name: str,
+    expense_id: int,
+    field: str,
+    v: Optional[str] = Query(None, description="content hash from /files; makes the response immutable"),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user),
+):
+    path = _attachment_path(db, company_name, expense_id, field)
+    sha256 = storage.blob_hash(path)
+    # 404 until the background job has produced it; clients fall back to the original
+    return _file_response(request, storage.thumbnail_path(path), f"{sha256}-thumb" if sha256 else None,
+                          immutable=v is not None and v == sha256)
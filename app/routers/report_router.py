@@ -0,0 +1,40 @@
+# app/routers/report_router.py
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.deps import get_db, get_current_user
+from app import crud, reports, schemas_expenses
+
+router = APIRouter(tags=["reports"])
+
+_MONTH = "^[0-9]{4}-[0-9]{2}$"
+
+
+# ---------------------------------------------------------
+# SUMMARY TOTALS (served from the expense_rollup table)
+# ---------------------------------------------------------
+@router.get("/summary", response_model=List[schemas_expenses.ExpenseSummaryRow], response_model_exclude_none=True)
+def expense_summary(
+    group_by: List[str] = Query(["company", "month"], description="company, month, vendor, expense_type, payment_type"),
+    company_name: Optional[List[str]] = Query(None),
+    month_from: Optional[str] = Query(None, pattern=_MONTH),
+    month_to: Optional[str] = Query(None, pattern=_MONTH),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    unknown = [g for g in group_by if g not in reports.GROUP_BY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot group by: {', '.join(unknown)}")
+    for name in company_name or []:
+        if not crud.get_model_for_company(name):
+            raise HTTPException(status_code=400, detail=f"Unknown company: {name}")
+
+    return reports.summarize(
+        db,
+        list(dict.fromkeys(group_by)),
+        company_names=company_name,
+        month_from=month_from,
+        month_to=month_to,
+    )
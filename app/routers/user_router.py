@@ -11,7 +11,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 def get_user_from_token(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     try:
-        payload = auth.decode_token(token)
+        payload = auth.decode_access_token(token)
         role = payload.get("role")
         if role != "user":
             raise HTTPException(status_code=403, detail="Not authorized")
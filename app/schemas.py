@@ -18,6 +18,14 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     role: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # access token lifetime, seconds
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
 # response
 class UserOut(BaseModel):
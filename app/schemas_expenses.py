@@ -1,7 +1,10 @@
 # app/schemas_expenses.py
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from typing import Optional, List
 from datetime import date, datetime
+from decimal import Decimal
+
+from app.amounts import MAX_INTEGER_DIGITS, parse_amount
 
 class ExpenseCreate(BaseModel):
     company_name: str
@@ -18,6 +21,12 @@ class ExpenseCreate(BaseModel):
     payment_type: Optional[str] = None  # "Cash" or "UPI"
     amount_paid: Optional[str] = None
 
+    @validator("invoice_amount", "amount_paid")
+    def amount_must_be_numeric(cls, v):
+        if v is not None and v.strip() and parse_amount(v) is None:
+            raise ValueError(f"must be a number below 10^{MAX_INTEGER_DIGITS}, e.g. 1250.50")
+        return v
+
 class ExpenseOut(BaseModel):
     id: int
     company_name: str
@@ -29,6 +38,7 @@ class ExpenseOut(BaseModel):
     invoice_number: Optional[str]
     vendor_name: Optional[str]
     invoice_amount: Optional[str]
+    invoice_amount_value: Optional[Decimal]
     purpose: Optional[str]
     purchased_by: Optional[str]
 
@@ -39,16 +49,86 @@ class ExpenseOut(BaseModel):
     payment_type: Optional[str]
     payment_type_flag: Optional[int]
     amount_paid: Optional[str]
+    amount_paid_value: Optional[Decimal]
     payment_screenshot: Optional[str]
     
     submitted_by: Optional[str]
     status: Optional[str]
 
     created_at: datetime
+    updated_at: Optional[datetime]
+    version: Optional[int]
+    duplicate_of: Optional[str]
 
     class Config:
         orm_mode = True
 
+class ExpensePage(BaseModel):
+    items: List[ExpenseOut]
+    next_cursor: Optional[str] = None
+
+class ExpenseSearchHit(ExpenseOut):
+    score: float
+
+class ExpenseSearchPage(BaseModel):
+    items: List[ExpenseSearchHit]
+    next_skip: Optional[int] = None  # pass as ?skip= for the next page
+
+class ExpenseBatchFilter(BaseModel):
+    # same fields as the listing query parameters
+    status: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    vendor_name: Optional[str] = None
+    expense_type_flag: Optional[int] = None
+    payment_type_flag: Optional[int] = None
+    submitted_by: Optional[str] = None
+    min_amount: Optional[Decimal] = None
+    max_amount: Optional[Decimal] = None
+    duplicate: Optional[bool] = None
+
+class ExpenseStatusBatch(BaseModel):
+    status: str
+    company_name: Optional[str] = None  # required with ids; omit to apply filters to every company
+    ids: Optional[List[int]] = None
+    filters: Optional[ExpenseBatchFilter] = None
+
+    @validator("filters", always=True)
+    def ids_or_filters(cls, v, values):
+        ids = values.get("ids")
+        if not ids and (v is None or not v.dict(exclude_none=True)):
+            raise ValueError("give ids or at least one filter")
+        if ids and not values.get("company_name"):
+            raise ValueError("company_name is required with ids")
+        return v
+
+class ExpenseStatusBatchResult(BaseModel):
+    status: str
+    updated: dict  # company name -> rows updated
+    total: int
+
+class ExpenseImportError(BaseModel):
+    row: int  # 1-based data row (header excluded)
+    errors: List[str]
+
+class ExpenseImportResult(BaseModel):
+    total: int
+    inserted: int
+    failed: int
+    errors: List[ExpenseImportError]
+
+class ExpenseSummaryRow(BaseModel):
+    # grouping columns are present only when requested via group_by
+    company_name: Optional[str] = None
+    month: Optional[str] = None
+    vendor_name: Optional[str] = None
+    expense_type: Optional[str] = None
+    payment_type: Optional[str] = None
+
+    expense_count: int
+    invoice_total: Decimal
+    paid_total: Decimal
+
 class VendorCreate(BaseModel):
     name: str
 
@@ -0,0 +1,164 @@
+# app/search.py
+"""
+Ranked full-text search over purpose, vendor_name, invoice_number and
+gst_number on every company expense table.
+
+MySQL uses a FULLTEXT index per table (MATCH ... AGAINST in boolean mode).
+SQLite setups get the same behaviour from an FTS5 inverted index per table,
+created next to the table and kept in sync by triggers, so every write path
+(ORM, bulk inserts, set-based updates) is covered without crud changes.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import DDL, Index, column, event, func, literal, literal_column, select, table, union_all
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session
+
+SEARCH_COLUMNS = ("purpose", "vendor_name", "invoice_number", "gst_number")
+# backends with a full-text index (see fulltext_index / ensure_sqlite_fts)
+SUPPORTED_DIALECTS = ("mysql", "sqlite")
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(q: str) -> List[str]:
+    return _TOKEN.findall(q or "")[:16]
+
+
+def fulltext_index(table_name: str) -> Index:
+    return Index(f"ft_{table_name}_search", *SEARCH_COLUMNS, mysql_prefix="FULLTEXT").ddl_if(dialect="mysql")
+
+
+# -----------------------------
+# SQLite FTS5 stand-in
+# -----------------------------
+def _fts_name(table_name: str) -> str:
+    return f"{table_name}_fts"
+
+
+def sqlite_fts_ddl(table_name: str) -> List[str]:
+    fts = _fts_name(table_name)
+    cols = ", ".join(SEARCH_COLUMNS)
+    new = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table_name}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {table_name}_fts_ai AFTER INSERT ON {table_name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table_name}_fts_ad AFTER DELETE ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table_name}_fts_au AFTER UPDATE OF {cols} ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def attach_sqlite_fts(expense_table) -> None:
+    """Creates the FTS5 table and triggers whenever create_all creates expense_table on SQLite."""
+    for statement in sqlite_fts_ddl(expense_table.name):
+        event.listen(expense_table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+
+def ensure_sqlite_fts(engine, company_models) -> None:
+    """For SQLite files created before search existed: add the FTS tables and index existing rows."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for Model in company_models:
+            table_name = Model.__tablename__
+            fts = _fts_name(table_name)
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+            ).first()
+            for statement in sqlite_fts_ddl(table_name):
+                conn.exec_driver_sql(statement)
+            if not exists:
+                conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+# -----------------------------
+# Query
+# -----------------------------
+def is_supported(db: Session) -> bool:
+    return db.get_bind().dialect.name in SUPPORTED_DIALECTS
+
+
+def _score_branch(db: Session, Model, terms: List[str]):
+    """(select of Model.id + score, score expression); higher score = better match."""
+    if db.get_bind().dialect.name == "mysql":
+        # +term* : every word must match, each as a prefix
+        against = " ".join(f"+{t}*" for t in terms)
+        score = mysql.match(*(getattr(Model, c) for c in SEARCH_COLUMNS), against=against).in_boolean_mode()
+        return select(Model.id, score.label("score")).where(score > 0), score
+
+    fts_name = _fts_name(Model.__tablename__)
+    fts = table(fts_name, column("rowid"))
+    query = " ".join('"{}"*'.format(t.replace('"', "")) for t in terms)
+    # bm25() is lower-is-better, so negate it
+    score = -func.bm25(literal_column(fts_name))
+    stmt = (
+        select(Model.id, score.label("score"))
+        .select_from(Model)
+        .join(fts, fts.c.rowid == Model.id)
+        .where(literal_column(fts_name).op("MATCH")(query))
+    )
+    return stmt, score
+
+
+def search_expenses(
+    db: Session,
+    q: str,
+    company_models: dict,
+    limit: int = 20,
+    skip: int = 0,
+    filters: Optional[dict] = None,
+) -> Tuple[List[tuple], bool]:
+    """
+    Ranked hits across the given {company_name: Model} tables.
+    Each table contributes at most skip+limit+1 ids from its full-text index,
+    a UNION ALL ranks them, and only the requested page is loaded in full.
+    Returns ([(company_name, expense, score), ...], has_more). Only for
+    backends where is_supported(db) holds.
+    """
+    from app.crud import _apply_expense_filters
+
+    terms = tokenize(q)
+    if not terms:
+        return [], False
+
+    branches = []
+    for company_name, Model in company_models.items():
+        stmt, score = _score_branch(db, Model, terms)
+        stmt = _apply_expense_filters(stmt.add_columns(literal(company_name).label("company")), Model, filters)
+        stmt = stmt.order_by(score.desc(), Model.id.desc()).limit(skip + limit + 1)
+        branches.append(select(stmt.subquery()))
+    if not branches:
+        return [], False
+
+    merged = union_all(*branches).subquery()
+    ranked = db.execute(
+        select(merged.c.company, merged.c.id, merged.c.score)
+        .order_by(merged.c.score.desc(), merged.c.company, merged.c.id.desc())
+        .offset(skip)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+
+    # one IN query per table for the page's rows
+    wanted: dict = {}
+    for company_name, expense_id, _ in ranked:
+        wanted.setdefault(company_name, []).append(expense_id)
+    loaded = {}
+    for company_name, ids in wanted.items():
+        Model = company_models[company_name]
+        for inst in db.query(Model).filter(Model.id.in_(ids)):
+            loaded[(company_name, inst.id)] = inst
+
+    hits = [
+        (company_name, loaded[(company_name, expense_id)], float(score))
+        for company_name, expense_id, score in ranked
+        if (company_name, expense_id) in loaded
+    ]
+    return hits, has_more
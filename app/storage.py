@@ -0,0 +1,251 @@
+# app/storage.py
+import hashlib
+import os
+import time
+import uuid
+from collections import namedtuple
+from typing import Optional
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+
+SavedUpload = namedtuple("SavedUpload", ["path", "size", "sha256"])
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds settings.UPLOAD_MAX_BYTES."""
+
+
+def _stream_to_disk(src, dest: str, chunk_size: int, max_bytes: int) -> SavedUpload:
+    # copy in fixed-size chunks, hashing as we go; never holds the whole file
+    digest = hashlib.sha256()
+    size = 0
+    tmp = dest + ".part"
+    try:
+        with open(tmp, "wb") as out:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                out.write(chunk)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return SavedUpload(dest, size, digest.hexdigest())
+
+
+async def save_upload(upload_file: UploadFile, dest: str) -> Optional[SavedUpload]:
+    """
+    Streams an UploadFile to dest off the event loop.
+    Raises UploadTooLarge (and removes the partial file) past the size limit.
+    """
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    await upload_file.seek(0)
+    return await run_in_threadpool(
+        _stream_to_disk,
+        upload_file.file,
+        dest,
+        settings.UPLOAD_CHUNK_SIZE,
+        settings.UPLOAD_MAX_BYTES,
+    )
+
+
+# -----------------------------
+# Content-addressed blob store
+# -----------------------------
+UPLOAD_DIR = "uploads"
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+TMP_DIR = os.path.join(UPLOAD_DIR, "tmp")
+# per-kind folders hold files uploaded before the blob store
+LEGACY_DIRS = tuple(os.path.join(UPLOAD_DIR, kind) for kind in ("invoices", "qrcodes", "screenshots"))
+
+# expense columns that hold attachment paths
+ATTACHMENT_FIELDS = ("invoice_copy", "qrcode", "payment_screenshot")
+
+
+def ensure_upload_dirs() -> None:
+    """Called from the app's startup, not at import."""
+    for folder in (BLOB_DIR, TMP_DIR) + LEGACY_DIRS:
+        os.makedirs(folder, exist_ok=True)
+
+
+def blob_path(sha256: str, ext: str) -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], f"{sha256}{ext.lower()}")
+
+
+def thumbnail_path(path: str) -> str:
+    """WebP preview stored next to the original (see app.thumbnails)."""
+    return f"{os.path.splitext(path)[0]}.thumb.webp"
+
+
+def blob_hash(path: Optional[str]) -> Optional[str]:
+    """SHA-256 encoded in a blob path, or None for legacy/non-blob paths."""
+    if not path or not os.path.normpath(path).startswith(BLOB_DIR + os.sep):
+        return None
+    name = os.path.splitext(os.path.basename(path))[0]
+    if len(name) != 64 or any(c not in "0123456789abcdef" for c in name):
+        return None
+    return name
+
+
+def _locked_blob(db: Session, sha256: str):
+    # flush this session's pending counts first, then read (and lock) the current row
+    db.flush()
+    return (
+        db.query(models.AttachmentBlob)
+        .filter(models.AttachmentBlob.sha256 == sha256)
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
+
+
+def acquire_blob(db: Session, saved: SavedUpload, ext: str) -> str:
+    """
+    Adds one reference to the blob for a freshly streamed upload and returns
+    its stored path. Identical content collapses onto the existing file.
+    Changes are left in the session for the caller's commit.
+    """
+    blob = _locked_blob(db, saved.sha256)
+    if blob is None:
+        blob = models.AttachmentBlob(
+            sha256=saved.sha256, path=blob_path(saved.sha256, ext), size=saved.size, ref_count=0
+        )
+        if db.get_bind().dialect.name == "sqlite":
+            # pysqlite runs a SAVEPOINT opened before any DML in its own transaction
+            # (RELEASE commits it), so the retry below is MySQL-only; a concurrent
+            # insert of the same content fails this request instead
+            db.add(blob)
+        else:
+            try:
+                with db.begin_nested():
+                    db.add(blob)
+            except IntegrityError:
+                # a concurrent upload of the same content created the row first
+                blob = _locked_blob(db, saved.sha256)
+    blob.ref_count += 1
+
+    if os.path.exists(blob.path):
+        os.remove(saved.path)
+    else:
+        # new blob, or the row survived but the file didn't: put this copy in place
+        os.makedirs(os.path.dirname(blob.path), exist_ok=True)
+        os.replace(saved.path, blob.path)
+    return blob.path
+
+
+def release_blob(db: Session, path: Optional[str]) -> Optional[str]:
+    """
+    Drops one reference to the blob at path. Returns the file path once it is
+    orphaned so the caller can pass it to remove_orphans after committing.
+    """
+    sha256 = blob_hash(path)
+    if sha256 is None:
+        return None
+    blob = _locked_blob(db, sha256)
+    if blob is None:
+        return None
+    if blob.ref_count <= 1:
+        db.delete(blob)
+        return blob.path
+    blob.ref_count -= 1
+    return None
+
+
+def remove_files(paths) -> None:
+    for path in paths:
+        if not path:
+            continue
+        for p in (path, thumbnail_path(path)):
+            if os.path.exists(p):
+                os.remove(p)
+
+
+def remove_orphans(db: Session, paths) -> None:
+    """
+    Deletes blob files that release_blob reported as orphaned, after the
+    caller's commit. Each one is re-checked under the row lock first, since a
+    concurrent acquire_blob may have re-created the row and put the file back.
+    (The row lock is MySQL's; SQLite ignores FOR UPDATE.)
+    """
+    paths = [path for path in paths if blob_hash(path)]
+    if not paths:
+        return
+    for path in paths:
+        blob = _locked_blob(db, blob_hash(path))
+        if blob is None or blob.ref_count <= 0:
+            remove_files([path])
+    db.commit()
+
+
+async def store_upload(db: Session, upload_file: UploadFile) -> Optional[str]:
+    """Streams an upload into the blob store and returns the blob path."""
+    if not upload_file or not getattr(upload_file, "filename", None):
+        return None
+    ext = os.path.splitext(upload_file.filename)[1]
+    tmp = os.path.join(TMP_DIR, f"{uuid.uuid4().hex}{ext}")
+    saved = await save_upload(upload_file, tmp)
+    return await run_in_threadpool(acquire_blob, db, saved, ext)
+
+
+def collect_garbage(db: Session, grace_seconds: int = 3600) -> dict:
+    """
+    Recounts blob references across every expense table, fixes drifted
+    counters, and deletes unreferenced blobs plus stray files (e.g. left by a
+    failed insert) older than grace_seconds.
+    """
+    from app import crud
+
+    counts: dict = {}
+    for Model in crud._company_model_map.values():
+        for field in ATTACHMENT_FIELDS:
+            column = getattr(Model, field)
+            rows = (
+                db.query(column, func.count())
+                .filter(column.like(f"{BLOB_DIR}%"))
+                .group_by(column)
+                .all()
+            )
+            for path, n in rows:
+                sha256 = blob_hash(path)
+                if sha256:
+                    counts[sha256] = counts.get(sha256, 0) + n
+
+    orphaned, fixed = [], 0
+    known = set()
+    for blob in db.query(models.AttachmentBlob).yield_per(1000):
+        refs = counts.get(blob.sha256, 0)
+        if refs == 0:
+            orphaned.append(blob.path)
+            db.delete(blob)
+            continue
+        known.add(os.path.normpath(blob.path))
+        known.add(os.path.normpath(thumbnail_path(blob.path)))
+        if blob.ref_count != refs:
+            blob.ref_count = refs
+            fixed += 1
+    db.commit()
+    remove_orphans(db, orphaned)
+
+    cutoff = time.time() - grace_seconds
+    stray = []
+    for folder in (BLOB_DIR, TMP_DIR):
+        for root, _, files in os.walk(folder):
+            for name in files:
+                path = os.path.normpath(os.path.join(root, name))
+                if path not in known and os.path.getmtime(path) < cutoff:
+                    stray.append(path)
+    remove_files(stray)
+    return {"orphaned_blobs": len(orphaned), "fixed_counts": fixed, "stray_files": len(stray)}
@@ -0,0 +1,73 @@
+# app/thumbnails.py
+import logging
+import os
+import uuid
+from typing import Optional
+
+from app.config import settings
+from app.storage import thumbnail_path
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tif", ".tiff"}
+PDF_EXTENSIONS = {".pdf"}
+
+
+def _open_image(path: str):
+    from PIL import Image  # optional dependency, thumbnails are skipped without it
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PDF_EXTENSIONS:
+        import pypdfium2 as pdfium  # optional dependency, only needed for PDFs
+
+        pdf = pdfium.PdfDocument(path)
+        try:
+            page = pdf[0]
+            # render the first page just large enough for the thumbnail box
+            width, height = page.get_size()
+            scale = max(settings.THUMBNAIL_MAX_SIZE / max(width, height, 1), 0.1)
+            return page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+
+    image = Image.open(path)
+    image.draft("RGB", (settings.THUMBNAIL_MAX_SIZE, settings.THUMBNAIL_MAX_SIZE))  # cheap JPEG downscale
+    return image
+
+
+def generate_thumbnail(path: Optional[str]) -> Optional[str]:
+    """
+    Writes a WebP preview next to path (first page for PDFs) and returns its
+    path. Content-addressed blobs share one thumbnail, so existing ones are
+    reused. Failures are logged and return None: a missing preview must never
+    break an upload.
+    """
+    if not settings.THUMBNAILS_ENABLED or not path or not os.path.isfile(path):
+        return None
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in IMAGE_EXTENSIONS and ext not in PDF_EXTENSIONS:
+        return None
+
+    dest = thumbnail_path(path)
+    if os.path.exists(dest):
+        return dest
+
+    tmp = f"{dest}.{uuid.uuid4().hex}.part"
+    try:
+        from PIL import ImageOps
+
+        image = _open_image(path)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        image.thumbnail((settings.THUMBNAIL_MAX_SIZE, settings.THUMBNAIL_MAX_SIZE))
+        image.save(tmp, format="WEBP", quality=settings.THUMBNAIL_QUALITY, method=4)
+        os.replace(tmp, dest)
+        return dest
+    except ImportError as exc:
+        logger.warning("Thumbnail support unavailable (%s), skipping %s", exc, path)
+    except Exception:
+        logger.exception("Failed to build thumbnail for %s", path)
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    return None
@@ -0,0 +1,76 @@
+# app/vendor_index.py
+import bisect
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+
+
+class VendorIndex:
+    """
+    Vendors sorted by lower-cased name, for prefix lookups by bisection.
+    Vendors are insert-only, so (count, max id) identifies a snapshot and
+    gives every worker the same ETag for the same data.
+    """
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._keys: List[str] = []
+        self._entries: List[dict] = []
+        self._max_id = 0
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry(vendor) -> dict:
+        return {"id": vendor.id, "name": vendor.name, "created_at": vendor.created_at}
+
+    def load(self, db: Session) -> None:
+        vendors = db.query(models.Vendor).all()
+        entries = sorted((self._entry(v) for v in vendors), key=lambda e: (e["name"].lower(), e["id"]))
+        with self._lock:
+            self._entries = entries
+            self._keys = [e["name"].lower() for e in entries]
+            self._max_id = max((e["id"] for e in entries), default=0)
+            self._loaded_at = time.monotonic()
+
+    def ensure_fresh(self, db: Session) -> None:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+            self.load(db)
+
+    def add(self, vendor) -> None:
+        if self._loaded_at is None:
+            return  # loads everything on first use anyway
+        entry = self._entry(vendor)
+        key = entry["name"].lower()
+        with self._lock:
+            pos = bisect.bisect_right(self._keys, key)
+            self._keys.insert(pos, key)
+            self._entries.insert(pos, entry)
+            self._max_id = max(self._max_id, entry["id"])
+
+    def search(self, prefix: str, limit: int) -> List[dict]:
+        key = prefix.lower()
+        with self._lock:
+            start = bisect.bisect_left(self._keys, key)
+            out = []
+            for i in range(start, len(self._keys)):
+                if not self._keys[i].startswith(key) or len(out) >= limit:
+                    break
+                out.append(self._entries[i])
+            return out
+
+    def all(self) -> List[dict]:
+        with self._lock:
+            return list(self._entries)
+
+    @property
+    def etag(self) -> str:
+        return f'"vendors-{len(self._entries)}-{self._max_id}"'
+
+
+vendor_index = VendorIndex(refresh_seconds=settings.VENDOR_INDEX_REFRESH_SECONDS)
@@ -0,0 +1,49 @@
+# backfill_amounts.py
+import argparse
+
+from app.database import SessionLocal
+from app import crud
+
+
+def backfill(batch_size: int, start_after: int, company_name: str = None):
+    if start_after and not company_name:
+        # ids are per company table, so a resume point only means something for one of them
+        raise ValueError("start_after needs company_name")
+    companies = [company_name] if company_name else list(crud._company_model_map)
+    db = SessionLocal()
+    try:
+        for name in companies:
+            Model = crud.get_model_for_company(name)
+            if not Model:
+                print("Unknown company:", name)
+                continue
+            result = crud.backfill_amount_columns(
+                db, Model,
+                batch_size=batch_size,
+                start_after=start_after,
+                progress=lambda table, last_id, done: print(f"{table}: {done} rows, last id {last_id}"),
+            )
+            print(f"{Model.__tablename__}: updated {result['updated']} rows, "
+                  f"{result['unparseable']} unparseable amounts left NULL")
+            # fingerprints hash the parsed amount, so they follow the amount pass
+            result = crud.backfill_fingerprints(
+                db, name,
+                batch_size=batch_size,
+                start_after=start_after,
+                progress=lambda table, last_id, done: print(f"{table}: {done} fingerprints, last id {last_id}"),
+            )
+            print(f"{Model.__tablename__}: fingerprinted {result['updated']} rows, "
+                  f"{result['flagged']} flagged as duplicate invoices")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill numeric amount columns and duplicate-invoice fingerprints")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--start-after", type=int, default=0,
+                        help="resume after this expense id (requires --company)")
+    parser.add_argument("--company", default=None, help="only backfill this company")
+    args = parser.parse_args()
+    if args.start_after and not args.company:
+        parser.error("--start-after requires --company (expense ids are per company table)")
+    backfill(args.batch_size, args.start_after, args.company)
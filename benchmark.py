@@ -0,0 +1,546 @@
+# benchmark.py
+"""
+Reproducible latency/throughput benchmark for the API.
+
+Runs the FastAPI app in-process (httpx ASGI transport, no network) against a
+seeded SQLite file or a throwaway MySQL database and writes JSON results that
+can be compared across commits:
+
+    python benchmark.py --expenses 100000 --output before.json
+    python benchmark.py --expenses 100000 --output after.json --compare before.json
+
+Cold-start time (import, lifespan startup, whole process, and a batch of
+workers started in parallel) is measured first, in fresh interpreters.
+
+Seeded data is reused when the database already holds enough rows, so large
+volumes (e.g. --expenses 1000000) only pay the seeding cost once per file.
+Needs httpx (the same package FastAPI's TestClient uses).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+
+ADMIN_EMAIL = "bench-admin@example.com"
+USER_EMAIL = "bench-user@example.com"
+PASSWORD = "bench-password"
+
+
+# -----------------------------
+# Attachments
+# -----------------------------
+def make_png(size: int = 256) -> bytes:
+    """Random-noise PNG, so every upload is a distinct blob."""
+    raw = b"".join(b"\x00" + os.urandom(size * 3) for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b"")
+
+
+def make_pdf() -> bytes:
+    """Single-page PDF with a unique comment."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>",
+    ]
+    out = b"%PDF-1.4\n%" + os.urandom(8).hex().encode() + b"\n"
+    offsets = []
+    for n, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % n + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+# -----------------------------
+# Seeding
+# -----------------------------
+def seed(per_company: int, vendors: int, batch_size: int = 5000) -> dict:
+    from sqlalchemy import func, insert
+
+    from app import auth, crud, models
+    from app.amounts import parse_amount
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if not crud.get_admin_by_email(db, ADMIN_EMAIL):
+            crud.create_admin(db, "bench-admin", ADMIN_EMAIL, auth.hash_password(PASSWORD))
+        if not crud.get_user_by_email(db, USER_EMAIL):
+            user = crud.create_user(db, "bench-user", USER_EMAIL, auth.hash_password(PASSWORD))
+            crud.approve_user(db, user.id)
+
+        have = db.query(func.count(models.Vendor.id)).scalar()
+        if have < vendors:
+            db.execute(insert(models.Vendor), [{"name": f"Vendor {i:06d}"} for i in range(have, vendors)])
+            db.commit()
+
+        rng = random.Random(42)
+        start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        counts = {}
+        for company_name, Model in crud._company_model_map.items():
+            have = db.query(func.count(Model.id)).scalar()
+            for offset in range(have, per_company, batch_size):
+                rows = []
+                for i in range(offset, min(offset + batch_size, per_company)):
+                    amount = f"{rng.randint(100, 500000)}.{rng.randint(0, 99):02d}"
+                    rows.append({
+                        "company_name": company_name,
+                        "expense_type": "Purchase" if i % 3 else "Others",
+                        "expense_type_flag": 0 if i % 3 else 1,
+                        "date": date(2020, 1, 1) + timedelta(days=i % 1500),
+                        "invoice_number": f"INV-{i:08d}",
+                        "vendor_name": f"Vendor {rng.randrange(max(vendors, 1)):06d}",
+                        "invoice_amount": amount,
+                        "invoice_amount_value": parse_amount(amount),
+                        "purpose": "benchmark seed",
+                        "purchased_by": "bench-user",
+                        "amount_paid_by": "bench-user",
+                        "payment_type": "UPI" if i % 2 else "Cash",
+                        "payment_type_flag": i % 2,
+                        "amount_paid": amount,
+                        "amount_paid_value": parse_amount(amount),
+                        "submitted_by": "bench-user",
+                        "status": "Completed" if i % 4 == 0 else "Pending",
+                        # explicit, strictly increasing timestamps keep keyset pages stable
+                        "created_at": start + timedelta(seconds=i),
+                    })
+                db.execute(insert(Model), rows)
+                db.commit()
+                print(f"  seeded {Model.__tablename__}: {offset + len(rows)}/{per_company}", file=sys.stderr)
+            counts[company_name] = max(have, per_company)
+        return counts
+    finally:
+        db.close()
+
+
+def cursor_at_depth(company_name: str, depth: int):
+    """Keyset cursor pointing at the same row as ?skip=depth on the offset listing."""
+    from app import crud
+    from app.database import SessionLocal
+
+    if depth == 0:
+        return None
+    Model = crud.get_model_for_company(company_name)
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(Model.created_at, Model.id)
+            .order_by(Model.created_at.desc(), Model.id.desc())
+            .offset(depth - 1)
+            .limit(1)
+            .first()
+        )
+        return crud.encode_cursor(row.created_at, row.id) if row else None
+    finally:
+        db.close()
+
+
+# -----------------------------
+# Measurement
+# -----------------------------
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+async def run_scenario(client, name: str, send, requests: int, concurrency: int, warmup: int) -> dict:
+    for i in range(warmup):
+        await send(client, i)
+
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            t0 = time.perf_counter()
+            response = await send(client, i)
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return summarize(name, latencies, errors, concurrency, elapsed)
+
+
+def selected(only, name: str) -> bool:
+    return not only or any(name.startswith(o) for o in only)
+
+
+def summarize(name: str, latencies: list, errors: int, concurrency: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    ms = [v * 1000 for v in latencies]
+    result = {
+        "name": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "min_ms": round(ms[0], 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p90_ms": round(percentile(ms, 90), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    print(
+        f"{name:<40} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+        f"{result['throughput_rps']:>9.1f} req/s  errors {errors}",
+        file=sys.stderr,
+    )
+    return result
+
+
+# -----------------------------
+# Startup
+# -----------------------------
+# Runs in a fresh interpreter: import app.main, then enter the lifespan
+# (what a new worker does before it can take traffic).
+STARTUP_PROBE = """
+import asyncio, json, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+
+async def probe():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        t2 = time.perf_counter()
+        from app import database
+        print(json.dumps({"import": t1 - t0, "lifespan": t2 - t1, "engine_created": database._engine is not None}))
+
+asyncio.run(probe())
+"""
+
+
+def _start_probe(workdir: str) -> subprocess.Popen:
+    # the repo goes first, ahead of whatever PYTHONPATH the caller relies on
+    pythonpath = [os.path.dirname(os.path.abspath(__file__)), os.environ.get("PYTHONPATH")]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in pythonpath if p))
+    return subprocess.Popen([sys.executable, "-c", STARTUP_PROBE], cwd=workdir, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def _finish_probe(process: subprocess.Popen):
+    out, err = process.communicate()
+    if process.returncode != 0:
+        print(err, file=sys.stderr)
+        return None
+    probe = json.loads(out.strip().splitlines()[-1])
+    if probe["engine_created"]:
+        print("warning: startup created a database engine", file=sys.stderr)
+    return probe
+
+
+def run_startup(workdir: str, runs: int, parallel: int) -> list:
+    """
+    Cold starts in fresh processes: import time, lifespan startup time and
+    whole-process time (interpreter start to exit), one process at a time;
+    then `parallel` processes at once, timed until the last one is done.
+    """
+    imports, lifespans, processes, errors = [], [], [], 0
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        started = time.perf_counter()
+        probe = _finish_probe(_start_probe(workdir))
+        if probe is None:
+            errors += 1
+            continue
+        processes.append(time.perf_counter() - started)
+        imports.append(probe["import"])
+        lifespans.append(probe["lifespan"])
+    elapsed = time.perf_counter() - t0
+    results = [
+        summarize("startup/import app.main", imports, errors, 1, elapsed),
+        summarize("startup/lifespan", lifespans, errors, 1, elapsed),
+        summarize("startup/process", processes, errors, 1, elapsed),
+    ]
+
+    if parallel > 1:
+        t0 = time.perf_counter()
+        batch = [_start_probe(workdir) for _ in range(parallel)]
+        probes = [_finish_probe(p) for p in batch]
+        elapsed = time.perf_counter() - t0
+        # per-process latency isn't observable from here; every sample is the batch wall time
+        done = [elapsed for p in probes if p is not None]
+        results.append(summarize(f"startup/process x{parallel} parallel", done,
+                                 len(probes) - len(done), parallel, elapsed))
+    return results
+
+
+def insert_tied_rows(per_table: int = 4) -> None:
+    """
+    Newest rows for check_keyset_pages: one INSERT per table with no
+    created_at, so the server default stamps them all with one timestamp
+    (the seeded rows carry explicit values, which would hide storage issues).
+    """
+    from sqlalchemy import insert
+
+    from app import crud
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for company_name, Model in crud._company_model_map.items():
+            db.execute(insert(Model), [{
+                "company_name": company_name,
+                "expense_type": "Others",
+                "expense_type_flag": 1,
+                "date": date(2020, 1, 1),
+                "purpose": "keyset check",
+                "status": "Pending",
+            } for _ in range(per_table)])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def check_keyset_pages(client, headers, company_name: str, pages: int = 5, page_size: int = 3) -> list:
+    """
+    Walks the first pages of the keyset listings, per company and across
+    companies (starting with the rows from insert_tied_rows), and returns the
+    problems found: rows repeated or out of created_at order.
+    """
+    problems, seen, last, cursor = [], set(), None, None
+    for _ in range(pages):
+        params = {"limit": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await client.get(f"/expenses/company/{company_name}/page", headers=headers, params=params)).json()
+        for item in page["items"]:
+            key = (item["created_at"], item["id"])
+            if item["id"] in seen or (last is not None and key >= last):
+                problems.append(f"/page: row {item['id']} repeated or out of order")
+            seen.add(item["id"])
+            last = key
+        cursor = page.get("next_cursor")
+        if not cursor:
+            break
+
+    # cross-company listing: the tied rows span every table, so the (source, id) tiebreak is crossed
+    seen, last, cursor = set(), None, None
+    for _ in range(pages):
+        params = {"limit": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await client.get("/expenses/all", headers=headers, params=params)).json()
+        for item in page["items"]:
+            key = (item["company_name"], item["id"])
+            if key in seen or (last is not None and item["created_at"] > last):
+                problems.append(f"/all: row {key} repeated or out of order")
+            seen.add(key)
+            last = item["created_at"]
+        cursor = page.get("next_cursor")
+        if not cursor:
+            break
+    return problems
+
+
+async def run_all(args, counts: dict) -> list:
+    import httpx
+
+    from app.main import app
+
+    company_name = next(iter(counts))
+    depths = [d for d in args.depths if d < counts[company_name]]
+    cursors = {d: cursor_at_depth(company_name, d) for d in depths}
+    png, pdf = make_png, make_pdf
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            login = await client.post("/auth/login", data={"username": ADMIN_EMAIL, "password": PASSWORD})
+            login.raise_for_status()
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+            # latency numbers mean nothing if pagination repeats or skips rows
+            await asyncio.to_thread(insert_tied_rows)
+            problems = await check_keyset_pages(client, headers, company_name)
+            if problems:
+                raise RuntimeError("keyset pagination check failed: " + "; ".join(problems))
+
+            scenarios = []
+
+            async def do_login(c, i):
+                return await c.post("/auth/login", data={"username": USER_EMAIL, "password": PASSWORD})
+            # argon2 is deliberately slow; cap the sample so runs stay short
+            scenarios.append(("auth/login", do_login, min(args.requests, args.login_requests)))
+
+            async def do_create(c, i):
+                return await c.post(
+                    "/expenses/create",
+                    headers=headers,
+                    data={
+                        "company_name": company_name,
+                        "expense_type": "Purchase",
+                        "date": "2024-03-01",
+                        "vendor_name": "Vendor 000001",
+                        "invoice_amount": "1,234.50",
+                        "amount_paid": "1,234.50",
+                        "payment_type": "UPI",
+                    },
+                    files={
+                        "invoice_copy": ("invoice.pdf", pdf(), "application/pdf"),
+                        "payment_screenshot": ("screenshot.png", png(), "image/png"),
+                    },
+                )
+            scenarios.append(("expenses/create+attachments", do_create, args.requests))
+
+            for depth in depths:
+                async def do_offset(c, i, depth=depth):
+                    return await c.get(
+                        f"/expenses/company/{company_name}",
+                        headers=headers, params={"skip": depth, "limit": args.page_size},
+                    )
+                scenarios.append((f"expenses/company offset={depth}", do_offset, args.requests))
+
+                async def do_keyset(c, i, cursor=cursors[depth]):
+                    params = {"limit": args.page_size}
+                    if cursor:
+                        params["cursor"] = cursor
+                    return await c.get(f"/expenses/company/{company_name}/page", headers=headers, params=params)
+                scenarios.append((f"expenses/company/page depth={depth}", do_keyset, args.requests))
+
+            async def do_search(c, i):
+                return await c.get("/expenses/search", headers=headers,
+                                   params={"q": f"{i % max(args.vendors, 1):06d}", "limit": 20})
+            scenarios.append(("expenses/search", do_search, args.requests))
+
+            async def do_vendors(c, i):
+                return await c.get("/expenses/vendor", headers=headers)
+            scenarios.append(("expenses/vendor", do_vendors, args.requests))
+
+            async def do_autocomplete(c, i):
+                return await c.get("/expenses/vendor/autocomplete", headers=headers,
+                                   params={"prefix": f"Vendor {i % 100:02d}"})
+            scenarios.append(("expenses/vendor/autocomplete", do_autocomplete, args.requests))
+
+            results = []
+            for name, send, n in scenarios:
+                if not selected(args.only, name):
+                    continue
+                results.append(await run_scenario(client, name, send, n, args.concurrency, args.warmup))
+            return results
+
+
+def compare(results: list, previous_path: str) -> None:
+    with open(previous_path) as f:
+        previous = {r["name"]: r for r in json.load(f)["results"]}
+    print(f"\nchange vs {previous_path} (negative latency / positive throughput is better)", file=sys.stderr)
+    for r in results:
+        old = previous.get(r["name"])
+        if not old:
+            continue
+
+        def pct(key):
+            return (r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(
+            f"{r['name']:<40} p50 {pct('p50_ms'):+7.1f}%  p99 {pct('p99_ms'):+7.1f}%  "
+            f"throughput {pct('throughput_rps'):+7.1f}%",
+            file=sys.stderr,
+        )
+
+
+def git_revision() -> str:
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=here, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the expense API in-process")
+    parser.add_argument("--database-url", default=None,
+                        help="SQLAlchemy URL (default: a SQLite file in --workdir); use a throwaway database")
+    parser.add_argument("--workdir", default=None, help="uploads and the default SQLite file live here")
+    parser.add_argument("--expenses", type=int, default=10000, help="seeded expenses per company")
+    parser.add_argument("--vendors", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--depths", default="0,1000,10000,100000,500000",
+                        help="comma-separated list offsets to measure (skipped beyond the seeded volume)")
+    parser.add_argument("--startup-runs", type=int, default=10,
+                        help="cold starts to measure in fresh processes (0 skips the startup scenarios)")
+    parser.add_argument("--only", action="append", help="run only scenarios whose name starts with this")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", default=None, help="previous results file to diff against")
+    args = parser.parse_args()
+    args.depths = [int(d) for d in args.depths.split(",") if d.strip()]
+
+    output = os.path.abspath(args.output)
+    previous = os.path.abspath(args.compare) if args.compare else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="expense-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    # settings are read at import time, so configure the environment first
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("JWT_SECRET", "bench-secret")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)  # uploads/ is relative to the working directory
+
+    results = []
+    if args.startup_runs and selected(args.only, "startup/"):
+        results.extend(run_startup(workdir, args.startup_runs, args.concurrency))
+
+    from app.database import get_engine
+    from app.migrate import migrate
+    migrate(log=lambda msg: print(msg, file=sys.stderr))
+    engine = get_engine()
+
+    print(f"seeding {args.expenses} expenses per company into {database_url}", file=sys.stderr)
+    t0 = time.perf_counter()
+    counts = seed(args.expenses, args.vendors)
+    seed_seconds = time.perf_counter() - t0
+
+    results.extend(asyncio.run(run_all(args, counts)))
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "expenses_per_company": counts,
+            "vendors": args.vendors,
+            "concurrency": args.concurrency,
+            "page_size": args.page_size,
+            "seed_seconds": round(seed_seconds, 2),
+            "startup_runs": args.startup_runs,
+        },
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {output}", file=sys.stderr)
+
+    if previous:
+        compare(results, previous)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,4 @@
-from app.database import engine, Base
-import app.models  # ensures models get registered
+# kept for existing deploy scripts; same as `python -m app.migrate`
+from app.migrate import migrate
 
-print("Creating tables...")
-Base.metadata.create_all(bind=engine)
-print("Tables created successfully!")
+migrate()
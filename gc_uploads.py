@@ -0,0 +1,16 @@
+# gc_uploads.py
+from app.database import SessionLocal
+from app import storage
+
+
+def gc_uploads():
+    db = SessionLocal()
+    try:
+        result = storage.collect_garbage(db)
+    finally:
+        db.close()
+    print("Removed {orphaned_blobs} orphaned blobs and {stray_files} stray files, "
+          "fixed {fixed_counts} reference counts".format(**result))
+
+if __name__ == "__main__":
+    gc_uploads()
@@ -0,0 +1,27 @@
+# generate_thumbnails.py
+import os
+
+from app.database import SessionLocal
+from app import crud, storage, thumbnails
+
+
+def generate_all():
+    """Builds missing previews for attachments uploaded before thumbnails existed."""
+    db = SessionLocal()
+    try:
+        paths = set()
+        for Model in crud._company_model_map.values():
+            for field in storage.ATTACHMENT_FIELDS:
+                column = getattr(Model, field)
+                paths.update(p for (p,) in db.query(column).filter(column.isnot(None)).distinct())
+    finally:
+        db.close()
+
+    created = 0
+    for path in sorted(paths):
+        if not os.path.exists(storage.thumbnail_path(path)) and thumbnails.generate_thumbnail(path):
+            created += 1
+    print(f"Checked {len(paths)} attachments, created {created} thumbnails")
+
+if __name__ == "__main__":
+    generate_all()
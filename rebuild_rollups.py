@@ -0,0 +1,17 @@
+# rebuild_rollups.py
+# Safe to run while the API is up: writers wait for the rebuild's transaction
+# (see reports.rebuild_rollups), so keep it off-peak on large tables.
+from app.database import SessionLocal
+from app import crud, reports
+
+
+def rebuild():
+    db = SessionLocal()
+    try:
+        groups = reports.rebuild_rollups(db, crud._company_model_map)
+    finally:
+        db.close()
+    print(f"Rebuilt expense_rollup: {groups} groups")
+
+if __name__ == "__main__":
+    rebuild()